@@ -0,0 +1,60 @@
+import sysconfig
+from pathlib import Path
+
+import pytest
+
+from pyalect.dialect import _REGISTERED_DIALECTS
+
+
+@pytest.fixture(autouse=True)
+def dialects():
+    yield
+    _REGISTERED_DIALECTS.clear()
+
+
+@pytest.fixture(scope="session")
+def site_packages_sources():
+    """The source of every module in site-packages (or at least a good number)."""
+    root = Path(sysconfig.get_paths()["purelib"])
+    sources = []
+    for path in root.rglob("*.py"):
+        try:
+            sources.append(path.read_bytes())
+        except OSError:  # pragma: no cover
+            continue
+        if len(sources) == 20000:
+            break
+    if not sources:  # pragma: no cover
+        pytest.skip(f"No sources found in {root}")
+    return sources
+
+
+def make_module_source(lines, dialects=()):
+    """Generate a module of (roughly) the given number of lines."""
+    header = f"# dialect={', '.join(dialects)}\n" if dialects else ""
+    chunk = (
+        "def function_{i}(a, b=1, *args, **kwargs):\n"
+        "    value = [a + b * x for x in range(10) if x % 2]\n"
+        "    return {{'value': value, 'name': f'function_{i}'}}\n"
+        "\n"
+    )
+    return header + "".join(chunk.format(i=i) for i in range(max(1, lines // 4)))
+
+
+def make_package(root, name, subpackages, modules, dialects=()):
+    """Generate a package whose ``__init__`` imports all of its modules."""
+    package = root / name
+    package.mkdir()
+    imports = []
+    for i in range(subpackages):
+        subpackage = package / f"sub_{i}"
+        subpackage.mkdir()
+        names = [f"module_{j}" for j in range(modules)]
+        for module in names:
+            (subpackage / f"{module}.py").write_text(make_module_source(20, dialects))
+        (subpackage / "__init__.py").write_text(
+            "".join(f"from . import {module}\n" for module in names)
+        )
+        imports.append(f"from . import sub_{i}\n")
+    (package / "__init__.py").write_text("".join(imports))
+    return package
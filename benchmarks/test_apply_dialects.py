@@ -0,0 +1,76 @@
+import ast
+import io
+import tokenize
+
+import pytest
+
+from pyalect import Dialect, VisitorDialect
+from pyalect.dialect import apply_dialects, dialect_reducer
+
+from .conftest import make_module_source
+
+
+class RenameNames(ast.NodeTransformer):
+    def visit_Name(self, node):
+        node.id = node.id.upper()
+        return node
+
+
+def rename_tokens(tokens):
+    for token in tokens:
+        if token.type == tokenize.NAME:
+            token = token._replace(string=token.string.upper())
+        yield token
+
+
+def register_dialects(kind, count):
+    names = [f"{kind}_{i}" for i in range(count)]
+    for name in names:
+        if kind == "transformer":
+
+            class TransformerDialect(Dialect, name=name):
+                def transform_ast(self, node):
+                    return RenameNames().visit(node)
+
+        elif kind == "visitor":
+
+            class RenameVisitor(VisitorDialect, name=name):
+                def visit_Name(self, node):
+                    node.id = node.id.upper()
+                    return node
+
+        elif kind == "source":
+
+            class SourceDialect(Dialect, name=name):
+                def transform_src(self, source):
+                    tokens = tokenize.generate_tokens(io.StringIO(source).readline)
+                    return tokenize.untokenize(rename_tokens(tokens))
+
+        else:
+
+            class TokenDialect(Dialect, name=name):
+                def transform_tokens(self, tokens):
+                    return rename_tokens(tokens)
+
+    return names
+
+
+@pytest.mark.parametrize("lines", [100, 10_000, 100_000])
+@pytest.mark.parametrize("count", [1, 3, 10])
+@pytest.mark.parametrize("kind", ["transformer", "visitor"])
+def test_apply_ast_dialects(benchmark, kind, count, lines):
+    names = register_dialects(kind, count)
+    source = make_module_source(lines, names)
+    benchmark(apply_dialects, source, names)
+    benchmark.extra_info["lines"] = source.count("\n")
+
+
+@pytest.mark.parametrize("lines", [100, 10_000, 100_000])
+@pytest.mark.parametrize("count", [1, 3, 10])
+@pytest.mark.parametrize("kind", ["source", "tokens"])
+def test_apply_source_dialects(benchmark, kind, count, lines):
+    names = register_dialects(kind, count)
+    source = make_module_source(lines, names)
+    reducer = dialect_reducer(names)
+    benchmark.pedantic(reducer.transform_src, (source,), rounds=3)
+    benchmark.extra_info["lines"] = source.count("\n")
@@ -0,0 +1,58 @@
+import io
+import tokenize
+
+import pytest
+
+from pyalect.dialect import DIALECT_COMMENT, find_source_dialects
+
+
+def tokenize_source_dialects(source):
+    """The tokenizer based header check which is used as a fallback."""
+    for token in tokenize.tokenize(io.BytesIO(source).readline):
+        if token.type == tokenize.NEWLINE:
+            break
+        if token.type == tokenize.COMMENT:
+            match = DIALECT_COMMENT.match(token.string)
+            if match is not None:
+                return list(map(str.strip, match.groups()[0].split(",")))
+    return []
+
+
+def check_all(function, sources):
+    for src in sources:
+        try:
+            function(src)
+        except (SyntaxError, tokenize.TokenError):
+            pass
+
+
+@pytest.mark.parametrize(
+    "function",
+    [find_source_dialects, tokenize_source_dialects],
+    ids=["scan", "tokenize"],
+)
+def test_site_packages_headers(benchmark, site_packages_sources, function):
+    benchmark.pedantic(
+        check_all, (function, site_packages_sources), rounds=3, iterations=1
+    )
+    benchmark.extra_info["files"] = len(site_packages_sources)
+    benchmark.extra_info["headers_per_second"] = (
+        len(site_packages_sources) / benchmark.stats.stats.mean
+    )
+
+
+SYNTHETIC_HEADERS = {
+    "dialect": b"# dialect=html\n",
+    "stacked": b"# dialect=" + b", ".join(b"dialect_%d" % i for i in range(10)) + b"\n",
+    "no_dialect": b"import os\n",
+    "coding_cookie": b"#!/usr/bin/env python\n# -*- coding: utf-8 -*-\n# dialect=html\n",
+    "after_comments": b"# comment\n" * 50 + b"# dialect=html\n",
+    "after_docstring": b'"""' + b"A docstring.\n" * 50 + b'"""  # dialect=html\n',
+}
+
+
+@pytest.mark.parametrize("header", list(SYNTHETIC_HEADERS))
+@pytest.mark.parametrize("body_lines", [0, 10_000])
+def test_synthetic_headers(benchmark, header, body_lines):
+    source = SYNTHETIC_HEADERS[header] + b"x = 1\n" * body_lines
+    benchmark(find_source_dialects, source)
@@ -0,0 +1,63 @@
+import importlib
+from importlib.machinery import PathFinder
+
+import pytest
+
+from pyalect import Dialect, importer
+from pyalect.importer import PyalectFinder
+
+ENTRIES = 200
+
+
+@pytest.fixture(scope="module")
+def long_path(tmp_path_factory):
+    """Many directories on sys.path, with the modules we look for in the last one."""
+    root = tmp_path_factory.mktemp("long_path")
+    entries = []
+    for i in range(ENTRIES):
+        entry = root / f"entry_{i}"
+        entry.mkdir()
+        for j in range(10):
+            (entry / f"filler_{i}_{j}.py").write_text("x = 1\n")
+        entries.append(str(entry))
+    (entry / "plain_module.py").write_text("x = 1\n")
+    (entry / "dialect_module.py").write_text("# dialect=test\nx = 1\n")
+    return entries
+
+
+@pytest.fixture
+def sys_path(monkeypatch, long_path):
+    class MyDialect(Dialect):
+        name = "test"
+
+    monkeypatch.setattr("sys.path", list(long_path))
+    monkeypatch.setattr("sys.path_importer_cache", {})
+    importlib.invalidate_caches()
+    return long_path
+
+
+@pytest.mark.parametrize("module", ["plain_module", "dialect_module"])
+@pytest.mark.parametrize("cache", ["cold", "warm"])
+def test_meta_path_finder(benchmark, sys_path, module, cache):
+    if cache == "warm":
+        finder = PyalectFinder()
+        benchmark(finder.find_spec, module, None)
+    else:
+        benchmark(lambda: PyalectFinder().find_spec(module, None))
+    benchmark.extra_info["entries"] = len(sys_path)
+
+
+@pytest.mark.parametrize("module", ["plain_module", "dialect_module"])
+@pytest.mark.parametrize("installed", [True, False], ids=["installed", "uninstalled"])
+def test_path_finder(benchmark, sys_path, module, installed):
+    if not installed:
+        importer.uninstall()
+    try:
+        spec = benchmark(PathFinder.find_spec, module)
+    finally:
+        importer.install()
+    assert spec is not None
+    assert isinstance(spec.loader, importer.PyalectLoader) == (
+        installed and module == "dialect_module"
+    )
+    benchmark.extra_info["entries"] = len(sys_path)
@@ -0,0 +1,65 @@
+import importlib
+import sys
+
+import pytest
+
+from pyalect import Dialect, importer
+
+from .conftest import make_package
+
+SUBPACKAGES = 20
+MODULES = 25
+
+
+@pytest.fixture(scope="module")
+def packages(tmp_path_factory):
+    root = tmp_path_factory.mktemp("packages")
+    make_package(root, "plain_tree", SUBPACKAGES, MODULES)
+    make_package(root, "dialect_tree", SUBPACKAGES, MODULES, ["test"])
+    return root
+
+
+@pytest.fixture
+def import_package(monkeypatch, packages):
+    class MyDialect(Dialect):
+        name = "test"
+
+    monkeypatch.syspath_prepend(str(packages))
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+
+    def forget(name):
+        for module in [m for m in sys.modules if m.split(".")[0] == name]:
+            del sys.modules[module]
+        for entry in [
+            p for p in sys.path_importer_cache if p.startswith(str(packages))
+        ]:
+            del sys.path_importer_cache[entry]
+        importlib.invalidate_caches()
+
+    def run(benchmark, name):
+        # the first import writes bytecode caches - later ones should only read them
+        importlib.import_module(name)
+        benchmark.pedantic(
+            importlib.import_module,
+            (name,),
+            setup=lambda: forget(name),
+            rounds=10,
+        )
+        forget(name)
+        benchmark.extra_info["modules"] = SUBPACKAGES * (MODULES + 1) + 1
+
+    return run
+
+
+@pytest.mark.parametrize("installed", [True, False], ids=["installed", "uninstalled"])
+def test_import_plain_package(benchmark, import_package, installed):
+    if not installed:
+        importer.uninstall()
+    try:
+        import_package(benchmark, "plain_tree")
+    finally:
+        importer.install()
+
+
+def test_import_dialect_package(benchmark, import_package):
+    import_package(benchmark, "dialect_tree")
@@ -1,15 +1,32 @@
 __version__ = "0.1.0"
-from . import importer, shims
-from .dialect import Dialect, apply_dialects, deregister, register, registered
+from . import importer, instrument, shims
+from .aio import import_module_async
+from .compiler import apply_dialects_many, compile_source, exec_source
+from .dialect import (
+    Dialect,
+    VisitorDialect,
+    apply_dialects,
+    deregister,
+    register,
+    registered,
+)
 from .errors import DialectError
+from .precompile import warmup
 
 __all__ = [
     "apply_dialects",
+    "apply_dialects_many",
+    "compile_source",
     "deregister",
     "DialectError",
+    "exec_source",
+    "import_module_async",
     "importer",
+    "instrument",
     "register",
     "registered",
     "shims",
     "Dialect",
+    "VisitorDialect",
+    "warmup",
 ]
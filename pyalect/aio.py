@@ -0,0 +1,103 @@
+"""Import dialect modules from :mod:`asyncio` code without blocking the event loop.
+
+Transpiling a large module can take long enough to stall everything else running on
+the loop. :func:`import_module_async` finds, transpiles, and compiles a module in an
+executor, and only runs the module's code on the loop:
+
+.. code-block::
+
+    import pyalect
+
+    async def load_plugin(name):
+        return await pyalect.import_module_async(f"plugins.{name}")
+"""
+
+import importlib
+import sys
+import weakref
+from concurrent.futures import Executor
+from importlib.machinery import ModuleSpec
+from importlib.util import find_spec, module_from_spec, resolve_name
+from types import ModuleType
+from typing import TYPE_CHECKING, Dict, Optional
+
+from .importer import PyalectLoader
+
+if TYPE_CHECKING:  # pragma: no cover
+    import asyncio
+
+
+async def import_module_async(
+    name: str, package: Optional[str] = None, executor: Optional[Executor] = None
+) -> ModuleType:
+    """Import a module like :func:`importlib.import_module` but without blocking.
+
+    If the module has dialects it's found and transpiled (or loaded from the cache) in
+    ``executor``, then executed on the running event loop. Other modules are imported
+    normally. Coroutines which ask for the same module at the same time share one
+    import, and cancelling one of them doesn't cancel it for the others.
+
+    Parameters:
+        name: the module to import - relative names need a ``package``.
+        package: the package to resolve a relative name against.
+        executor: a thread pool to do the work in - the loop's default executor if
+            not given.
+    """
+    import asyncio
+
+    if name.startswith("."):
+        if not package:
+            raise TypeError(f"The 'package' argument is required for {name!r}")
+        name = resolve_name(name, package)
+    if name in sys.modules:
+        return sys.modules[name]
+
+    loop = asyncio.get_event_loop()
+    pending = _PENDING.setdefault(loop, {})
+    task = pending.get(name)
+    if task is None:
+        task = pending[name] = loop.create_task(_import(name, executor))
+        task.add_done_callback(lambda _: pending.pop(name, None))
+    module: ModuleType = await asyncio.shield(task)
+    return module
+
+
+async def _import(name: str, executor: Optional[Executor]) -> ModuleType:
+    import asyncio
+
+    parent = name.rpartition(".")[0]
+    if parent:
+        await import_module_async(parent, executor=executor)
+
+    loop = asyncio.get_event_loop()
+    # finding a spec reads the module's dialect header
+    spec: Optional[ModuleSpec] = await loop.run_in_executor(executor, find_spec, name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    if not isinstance(spec.loader, PyalectLoader):
+        return importlib.import_module(name)
+
+    code = await loop.run_in_executor(executor, spec.loader.get_code, name)
+    if name in sys.modules:
+        # it was imported some other way in the meantime
+        return sys.modules[name]
+
+    module = module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        exec(code, module.__dict__)
+    except BaseException:
+        sys.modules.pop(name, None)
+        raise
+    # the module may have replaced itself
+    module = sys.modules[name]
+    if parent:
+        setattr(sys.modules[parent], name.rpartition(".")[2], module)
+    return module
+
+
+# imports in progress on each event loop
+_Pending = Dict[str, "asyncio.Task[ModuleType]"]
+_PENDING: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Pending]" = (
+    weakref.WeakKeyDictionary()
+)
@@ -1,24 +1,34 @@
 import ast
 import sys
+from typing import Optional
 
+import pytest
 from _pytest.assertion.rewrite import AssertionRewritingHook, rewrite_asserts
+from _pytest.config import Config
 
-from pyalect import Dialect
-
-_PYTEST_CONFIG = None
-for finder in sys.meta_path:
-    if isinstance(finder, AssertionRewritingHook):
-        _PYTEST_CONFIG = finder.config
+from pyalect import Dialect, __version__
 
 
 class RewritePytestAssertions(Dialect):
 
     name = "pytest"
 
+    config: Optional[Config] = None
+
+    @classmethod
+    def setup(cls) -> None:
+        for finder in sys.meta_path:
+            if isinstance(finder, AssertionRewritingHook):
+                cls.config = finder.config
+        # the rewritten code depends on pytest and its config - not only on this file
+        cls.version = f"{__version__}-pytest{pytest.__version__}"
+        if cls.config is not None and cls.config.getini("enable_assertion_pass_hook"):
+            cls.version += "-pass-hook"
+
     def transform_src(self, source: str) -> str:
         self.source = source
         return source
 
     def transform_ast(self, node: ast.AST) -> ast.AST:
-        rewrite_asserts(node, self.source, self.filename, _PYTEST_CONFIG)
+        rewrite_asserts(node, self.source, self.filename, self.config)
         return node
@@ -0,0 +1,310 @@
+"""Serve dialect modules from a single precompiled, memory-mapped bundle file.
+
+Even with cached bytecode each import has to search for, stat, and read files. A
+bundle holds the transpiled code of many modules along with an index of their names,
+so importing them takes one ``open`` and one ``mmap`` - useful for cold starts on
+network file systems:
+
+.. code-block:: bash
+
+    python -m pyalect bundle --import my_project.dialects -o my_project.pyalect my_project/
+    PYALECT_BUNDLE=my_project.pyalect python -m my_project
+
+Like ``unchecked-hash`` bytecode, the sources aren't checked when loading from a
+bundle, so it must be rebuilt when they change. By default only modules with
+dialects are included.
+"""
+
+import marshal
+import mmap
+import os
+import struct
+import sys
+import types
+import warnings
+from importlib.abc import Loader, MetaPathFinder
+from importlib.machinery import ModuleSpec
+from importlib.util import MAGIC_NUMBER, decode_source
+from types import CodeType
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .cache import _write_atomic
+from .dialect import find_file_dialects
+from .importer import PyalectLoader
+from .precompile import find_source_files, process_pool
+
+FORMAT_VERSION = 1
+
+# signature, Python's bytecode magic number, format version, index offset
+_HEADER = struct.Struct("<8s4sIQ")
+_SIGNATURE = b"PYALECT\0"
+
+
+class BundleEntry(NamedTuple):
+    """Describes a module in a bundle."""
+
+    origin: str
+    """The path to the module's source file when the bundle was built."""
+
+    is_package: bool
+    """Whether the module is a package (its origin is an ``__init__.py`` file)."""
+
+    dialects: List[str]
+    """The dialects the module was transpiled with."""
+
+    offset: int
+    """Where the module's marshalled code begins in the bundle."""
+
+    size: int
+    """The number of bytes of marshalled code."""
+
+
+class BuildResult(NamedTuple):
+    """The outcome of adding a single file to a bundle."""
+
+    path: str
+    """The path to the source file."""
+
+    status: str
+    """One of ``"bundled"``, ``"skipped"`` (the file has no dialects), or
+    ``"failed"``."""
+
+    error: Optional[str] = None
+    """A description of the problem if ``status`` is ``"failed"``."""
+
+
+def build_bundle(
+    output: Union[str, "os.PathLike[str]"],
+    paths: Iterable[Union[str, "os.PathLike[str]"]],
+    workers: int = 1,
+    imports: Sequence[str] = (),
+    all_modules: bool = False,
+) -> List[BuildResult]:
+    """Transpile modules and write their code to a bundle.
+
+    Module names are determined by the packages (directories with an ``__init__.py``)
+    which contain each file.
+
+    Parameters:
+        output: where to write the bundle.
+        paths: files, or directories which are searched recursively.
+        workers: the number of processes to use (``0`` means one per CPU).
+        imports: modules to import in each worker before compiling - these should
+            register the dialects which are needed.
+        all_modules: also include modules without dialects.
+
+    Returns:
+        A :class:`BuildResult` for each file, in order. The bundle is only written if
+        none failed.
+    """
+    files = list(find_source_files(paths))
+    entries: Dict[str, Tuple[str, bool, List[str], bytes]] = {}
+    results = []
+    with process_pool(workers, imports) as executor:
+        for path, outcome in zip(
+            files,
+            executor.map(_compile_entry, files, [all_modules] * len(files)),
+        ):
+            if isinstance(outcome, str):
+                results.append(BuildResult(path, "failed", outcome))
+            elif outcome is None:
+                results.append(BuildResult(path, "skipped"))
+            else:
+                name, is_package, dialects, code = outcome
+                entries[name] = (path, is_package, dialects, code)
+                results.append(BuildResult(path, "bundled"))
+
+    if all(r.status != "failed" for r in results):
+        _write_bundle(os.fspath(output), entries)
+    return results
+
+
+def module_name(path: str) -> Tuple[str, bool]:
+    """The name of the module at the given path and whether it's a package."""
+    directory, filename = os.path.split(os.path.abspath(path))
+    is_package = filename == "__init__.py"
+    parts = [] if is_package else [os.path.splitext(filename)[0]]
+    while os.path.exists(os.path.join(directory, "__init__.py")):
+        directory, package = os.path.split(directory)
+        parts.insert(0, package)
+    return ".".join(parts), is_package
+
+
+class BundleFinder(MetaPathFinder):
+    """Finds modules in a bundle - see :func:`install`.
+
+    Parameters:
+        path: the path to a bundle created by :func:`build_bundle`.
+    """
+
+    def __init__(self, path: Union[str, "os.PathLike[str]"]) -> None:
+        self.path = os.fspath(path)
+        with open(self.path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._index = self._read_index()
+        except BaseException:
+            self._data.close()
+            raise
+
+    def _read_index(self) -> Dict[str, BundleEntry]:
+        if len(self._data) < _HEADER.size:
+            raise ValueError(f"{self.path!r} is not a bundle")
+        signature, magic, version, index_offset = _HEADER.unpack_from(self._data)
+        if signature != _SIGNATURE or version != FORMAT_VERSION:
+            raise ValueError(f"{self.path!r} is not a bundle")
+        if magic != MAGIC_NUMBER:
+            raise ValueError(f"{self.path!r} was built for another version of Python")
+        try:
+            return {
+                name: BundleEntry(*entry)
+                for name, entry in marshal.loads(self._data[index_offset:]).items()
+            }
+        except (EOFError, ValueError, TypeError, AttributeError):
+            raise ValueError(f"{self.path!r} is not a bundle") from None
+
+    def modules(self) -> Dict[str, BundleEntry]:
+        """The modules in this bundle."""
+        return dict(self._index)
+
+    def find_spec(
+        self,
+        fullname: str,
+        path: Optional[Sequence[Union[bytes, str]]],
+        target: Optional[types.ModuleType] = None,
+    ) -> Optional[ModuleSpec]:
+        entry = self._index.get(fullname)
+        if entry is None:
+            return None
+        spec = ModuleSpec(
+            fullname,
+            BundleLoader(self, fullname, entry),
+            origin=entry.origin,
+            is_package=entry.is_package,
+        )
+        if entry.is_package:
+            spec.submodule_search_locations = [os.path.dirname(entry.origin)]
+        spec.has_location = True
+        return spec
+
+    def get_code(self, entry: BundleEntry) -> CodeType:
+        """Load the code for a module in this bundle."""
+        code: CodeType = marshal.loads(
+            self._data[entry.offset : entry.offset + entry.size]
+        )
+        return code
+
+    def close(self) -> None:
+        """Release the memory map - the bundle can't be used afterwards."""
+        self._data.close()
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.path!r})"
+
+
+class BundleLoader(Loader):
+    """Loads a module from a :class:`BundleFinder`."""
+
+    def __init__(self, finder: BundleFinder, fullname: str, entry: BundleEntry):
+        self.finder = finder
+        self.name = fullname
+        self.entry = entry
+
+    @property
+    def dialects(self) -> List[str]:
+        """The dialects the module was transpiled with."""
+        return self.entry.dialects
+
+    def create_module(self, spec: ModuleSpec) -> None:
+        return None
+
+    def exec_module(self, module: types.ModuleType) -> None:
+        exec(self.get_code(module.__name__), module.__dict__)
+
+    def get_code(self, fullname: str) -> CodeType:
+        return self.finder.get_code(self.entry)
+
+    def get_filename(self, fullname: str) -> str:
+        return self.entry.origin
+
+    def is_package(self, fullname: str) -> bool:
+        return self.entry.is_package
+
+    def get_source(self, fullname: str) -> Optional[str]:
+        # only used for tracebacks - the source may not have been deployed
+        try:
+            with open(self.entry.origin, "rb") as f:
+                return decode_source(f.read())
+        except OSError:
+            return None
+
+
+def install(path: Union[str, "os.PathLike[str]"]) -> BundleFinder:
+    """Serve modules from a bundle before any other finder is consulted.
+
+    This may also be done by setting the ``PYALECT_BUNDLE`` environment variable to
+    one or more bundle paths (separated by :data:`os.pathsep`).
+    """
+    finder = BundleFinder(path)
+    sys.meta_path.insert(0, finder)
+    return finder
+
+
+def uninstall(finder: BundleFinder) -> None:
+    """Stop serving modules from a bundle."""
+    if finder in sys.meta_path:
+        sys.meta_path.remove(finder)
+
+
+def _install_from_environ(value: str) -> None:
+    for path in filter(None, value.split(os.pathsep)):
+        try:
+            install(path)
+        except (OSError, ValueError) as error:
+            warnings.warn(f"Could not use bundle {path!r} - {error}")
+
+
+def _compile_entry(
+    path: str, all_modules: bool
+) -> Union[None, str, Tuple[str, bool, List[str], bytes]]:
+    try:
+        dialects = find_file_dialects(path)
+        if not dialects and not all_modules:
+            return None
+        name, is_package = module_name(path)
+        with open(path, "rb") as f:
+            source_bytes = f.read()
+        filename = os.path.abspath(path)
+        if dialects:
+            loader = PyalectLoader(dialects, name, filename)
+            code = loader.source_to_code(source_bytes, filename)
+        else:
+            code = compile(source_bytes, filename, "exec", dont_inherit=True)
+    except Exception as error:
+        return f"{type(error).__name__}: {error}"
+    return name, is_package, dialects, marshal.dumps(code)
+
+
+def _write_bundle(
+    path: str, entries: Dict[str, Tuple[str, bool, List[str], bytes]]
+) -> None:
+    chunks = []
+    index = {}
+    offset = _HEADER.size
+    for name, (origin, is_package, dialects, code) in sorted(entries.items()):
+        index[name] = (os.path.abspath(origin), is_package, dialects, offset, len(code))
+        chunks.append(code)
+        offset += len(code)
+    header = _HEADER.pack(_SIGNATURE, MAGIC_NUMBER, FORMAT_VERSION, offset)
+    data = b"".join([header, *chunks, marshal.dumps(index)])
+    if not _write_atomic(os.path.abspath(path), data):
+        raise OSError(f"Could not write bundle to {path!r}")
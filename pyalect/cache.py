@@ -0,0 +1,241 @@
+"""A bytecode cache for modules which are transpiled by dialects.
+
+Cached code is kept apart from the normal ``__pycache__/*.pyc`` files so that it's
+never served to, or overwritten by, the standard import machinery. Each entry records
+which dialects produced it (see :func:`dialects_key`) and supports the same
+invalidation modes as :mod:`py_compile` (see :pep:`552`).
+"""
+
+import hashlib
+import marshal
+import os
+import sys
+from importlib.util import MAGIC_NUMBER, cache_from_source
+from types import CodeType
+from typing import Iterable, Optional, Union
+
+from .dialect import _split_dialect_names, dialect_fingerprint
+
+try:
+    from _imp import check_hash_based_pycs as _check_hash_based_pycs
+except ImportError:  # pragma: no cover
+    _check_hash_based_pycs = "default"
+
+try:
+    from importlib.util import source_hash
+    from py_compile import PycInvalidationMode as PycInvalidationMode
+except ImportError:  # pragma: no cover
+    # Python 3.6 - hash based invalidation (PEP 552) isn't available
+    import enum
+
+    class PycInvalidationMode(enum.Enum):  # type: ignore
+        TIMESTAMP = 1
+
+    source_hash = None  # type: ignore
+
+_FLAG_HASH_BASED = 0b01
+_FLAG_CHECK_SOURCE = 0b10
+_KEY_SIZE = 16
+_HEADER_SIZE = 16 + _KEY_SIZE
+
+
+def cache_path(source_path: str) -> str:
+    """The path where code for the module at the given source path is cached."""
+    level = sys.flags.optimize
+    tag = "pyalect" if not level else f"pyalect{level}"
+    return cache_from_source(source_path, optimization=tag)
+
+
+def dialects_key(names: Union[str, Iterable[str]]) -> Optional[bytes]:
+    """Identify code transpiled by the given dialects (order matters).
+
+    Returns ``None`` if any of the dialects cannot be fingerprinted.
+    """
+    key = hashlib.blake2b(digest_size=_KEY_SIZE)
+    for name in _split_dialect_names(names):
+        fingerprint = dialect_fingerprint(name)
+        if fingerprint is None:
+            return None
+        key.update(f"{name}={fingerprint}\0".encode())
+    return key.digest()
+
+
+def default_invalidation_mode() -> PycInvalidationMode:
+    """Mirrors the default mode used by :mod:`py_compile`.
+
+    Only ``TIMESTAMP`` is supported before Python 3.7.
+    """
+    if os.environ.get("SOURCE_DATE_EPOCH") and source_hash is not None:
+        return PycInvalidationMode.CHECKED_HASH
+    else:
+        return PycInvalidationMode.TIMESTAMP
+
+
+def load_code(
+    source_path: str,
+    dialects: Union[str, Iterable[str]],
+    source_bytes: Optional[bytes] = None,
+) -> Optional[CodeType]:
+    """Load cached code for a module if it's still valid.
+
+    Parameters:
+        source_path: the path to the module's source file.
+        dialects: the dialects the module is transpiled with.
+        source_bytes: the module's source, if it has already been read.
+    """
+    key = dialects_key(dialects)
+    if key is None:
+        return None
+    try:
+        with open(cache_path(source_path), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    if (
+        len(data) < _HEADER_SIZE
+        or data[:4] != MAGIC_NUMBER
+        or data[16:_HEADER_SIZE] != key
+    ):
+        return None
+
+    flags = int.from_bytes(data[4:8], "little")
+    if flags & ~(_FLAG_HASH_BASED | _FLAG_CHECK_SOURCE):
+        return None
+    elif flags & _FLAG_HASH_BASED:
+        if source_hash is None:  # pragma: no cover
+            return None
+        elif _check_hash_based_pycs == "always" or (
+            _check_hash_based_pycs != "never" and flags & _FLAG_CHECK_SOURCE
+        ):
+            if source_bytes is None:
+                try:
+                    with open(source_path, "rb") as f:
+                        source_bytes = f.read()
+                except OSError:
+                    return None
+            if data[8:16] != source_hash(source_bytes):
+                return None
+    else:
+        try:
+            st = os.stat(source_path)
+        except OSError:
+            return None
+        if data[8:16] != _stat_stamp(st):
+            return None
+
+    try:
+        code = marshal.loads(data[_HEADER_SIZE:])
+    except (EOFError, ValueError, TypeError):
+        return None
+    return code if isinstance(code, CodeType) else None
+
+
+def dump_code(
+    source_path: str,
+    source_bytes: bytes,
+    dialects: Union[str, Iterable[str]],
+    code: CodeType,
+    invalidation_mode: Optional[PycInvalidationMode] = None,
+    source_stat: Optional[os.stat_result] = None,
+) -> bool:
+    """Write code for a module to the cache.
+
+    Parameters:
+        source_path: the path to the module's source file.
+        source_bytes: the source the code was transpiled from.
+        dialects: the dialects the module was transpiled with.
+        code: the code to cache.
+        invalidation_mode: how to determine whether the cache is stale.
+        source_stat: the result of :func:`os.stat` for the source file, taken before
+            it was read. Otherwise the file is stat'ed now, and changes made to it
+            since it was read would go unnoticed.
+
+    Returns:
+        Whether or not the code was cached.
+    """
+    header = _make_header(
+        source_path, source_bytes, dialects, invalidation_mode, source_stat
+    )
+    if header is None:
+        return False
+    return _write_atomic(cache_path(source_path), header + marshal.dumps(code))
+
+
+def is_cached(
+    source_path: str,
+    source_bytes: bytes,
+    dialects: Union[str, Iterable[str]],
+    invalidation_mode: Optional[PycInvalidationMode] = None,
+    source_stat: Optional[os.stat_result] = None,
+) -> bool:
+    """Whether the cache holds code for exactly this source, dialects, and mode.
+
+    Unlike :func:`load_code` this always compares against the source - even for
+    unchecked hash based entries - and the code itself is not loaded. See
+    :func:`dump_code` for ``source_stat``.
+    """
+    header = _make_header(
+        source_path, source_bytes, dialects, invalidation_mode, source_stat
+    )
+    if header is None:
+        return False
+    try:
+        with open(cache_path(source_path), "rb") as f:
+            return f.read(_HEADER_SIZE) == header
+    except OSError:
+        return False
+
+
+def _make_header(
+    source_path: str,
+    source_bytes: bytes,
+    dialects: Union[str, Iterable[str]],
+    invalidation_mode: Optional[PycInvalidationMode],
+    source_stat: Optional[os.stat_result] = None,
+) -> Optional[bytes]:
+    key = dialects_key(dialects)
+    if key is None:
+        return None
+
+    mode = invalidation_mode or default_invalidation_mode()
+    if mode == PycInvalidationMode.TIMESTAMP:
+        flags = 0
+        try:
+            stamp = _stat_stamp(source_stat or os.stat(source_path))
+        except OSError:
+            return None
+    else:
+        flags = _FLAG_HASH_BASED
+        if mode == PycInvalidationMode.CHECKED_HASH:
+            flags |= _FLAG_CHECK_SOURCE
+        stamp = source_hash(source_bytes)
+
+    return MAGIC_NUMBER + flags.to_bytes(4, "little") + stamp + key
+
+
+def _stat_stamp(st: os.stat_result) -> bytes:
+    mtime = int(st.st_mtime) & 0xFFFFFFFF
+    size = st.st_size & 0xFFFFFFFF
+    return mtime.to_bytes(4, "little") + size.to_bytes(4, "little")
+
+
+def _write_atomic(path: str, data: bytes) -> bool:
+    # unique per process so concurrent writers (e.g. pytest-xdist workers) don't clash
+    temp = f"{path}.{os.getpid()}.{id(path)}"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(temp, os.O_EXCL | os.O_CREAT | os.O_WRONLY, 0o666)
+        try:
+            with open(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        except OSError:
+            try:
+                os.unlink(temp)
+            except OSError:
+                pass
+            raise
+    except OSError:
+        return False
+    return True
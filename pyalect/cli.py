@@ -0,0 +1,263 @@
+"""Pyalect's command line interface - ``python -m pyalect --help``"""
+
+import argparse
+import sys
+from importlib import import_module
+from typing import List, Optional
+
+from . import bundle, export, manifest, precompile
+from .cache import PycInvalidationMode
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command line interface and return an exit code."""
+    parser = _make_parser()
+    args = parser.parse_args(argv)
+    for name in args.imports:
+        import_module(name)
+    code: int = args.run(args)
+    return code
+
+
+def _make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m pyalect", description="Tools for working with dialects."
+    )
+    commands = parser.add_subparsers(title="commands", dest="command")
+    commands.required = True
+
+    compile_parser = commands.add_parser(
+        "compile",
+        help="transpile dialect modules ahead of time",
+        description=(
+            "Transpile modules with dialect headers and write their code to the "
+            "cache used at import time. Files whose cache is up to date are skipped."
+        ),
+    )
+    _add_import_option(compile_parser)
+    _add_workers_option(compile_parser)
+    compile_parser.add_argument(
+        "paths", nargs="+", metavar="PATH", help="files or directories to compile"
+    )
+    compile_parser.add_argument(
+        "-f", "--force", action="store_true", help="compile even if up to date"
+    )
+    compile_parser.add_argument(
+        "-q", "--quiet", action="store_true", help="only report errors"
+    )
+    compile_parser.add_argument(
+        "--invalidation-mode",
+        choices=sorted(
+            mode.name.replace("_", "-").lower() for mode in PycInvalidationMode
+        ),
+        help="how the cache determines whether it's stale (see py_compile)",
+    )
+    compile_parser.set_defaults(run=_run_compile)
+
+    check_parser = commands.add_parser(
+        "check",
+        help="report every module which fails to transpile",
+        description=(
+            "Transpile modules with dialect headers without caching the result, and "
+            "report all the errors found rather than stopping at the first."
+        ),
+    )
+    _add_import_option(check_parser)
+    _add_workers_option(check_parser)
+    check_parser.add_argument(
+        "paths", nargs="+", metavar="PATH", help="files or directories to check"
+    )
+    check_parser.set_defaults(run=_run_check)
+
+    bundle_parser = commands.add_parser(
+        "bundle",
+        help="write transpiled modules to a single bundle file",
+        description=(
+            "Transpile modules with dialect headers and write their code to one file "
+            "which can be served from memory at import time (see PYALECT_BUNDLE)."
+        ),
+    )
+    _add_import_option(bundle_parser)
+    _add_workers_option(bundle_parser)
+    bundle_parser.add_argument(
+        "paths", nargs="+", metavar="PATH", help="files or directories to bundle"
+    )
+    bundle_parser.add_argument(
+        "-o", "--output", required=True, help="where to write the bundle"
+    )
+    bundle_parser.add_argument(
+        "-a",
+        "--all",
+        action="store_true",
+        dest="all_modules",
+        help="include modules without dialects",
+    )
+    bundle_parser.set_defaults(run=_run_bundle)
+
+    export_parser = commands.add_parser(
+        "export",
+        help="write dialect modules out as plain Python",
+        description=(
+            "Transpile modules with dialect headers and write them out as ordinary "
+            "Python files, copying the other modules, so Pyalect isn't needed to "
+            "run them."
+        ),
+    )
+    _add_import_option(export_parser)
+    _add_workers_option(export_parser)
+    export_parser.add_argument(
+        "paths", nargs="+", metavar="PATH", help="files or directories to export"
+    )
+    export_parser.add_argument(
+        "-o", "--output", required=True, help="the directory to write to"
+    )
+    export_parser.set_defaults(run=_run_export)
+
+    serve_parser = commands.add_parser(
+        "serve",
+        help="transpile modules for other processes",
+        description=(
+            "Transpile modules on behalf of processes started with PYALECT_SERVER "
+            "set to the given socket path, sharing the work between them."
+        ),
+    )
+    _add_import_option(serve_parser)
+    serve_parser.add_argument("socket", help="path of the Unix socket to listen on")
+    serve_parser.set_defaults(run=_run_serve)
+
+    manifest_parser = commands.add_parser(
+        "manifest",
+        help="record the dialects of every module in each directory",
+        description=(
+            "Write a manifest of the dialects used by the modules in each directory "
+            "so they don't need to be read at import time. Only modules which "
+            "changed since the last run are read."
+        ),
+    )
+    manifest_parser.add_argument(
+        "paths", nargs="+", metavar="PATH", help="directories to search recursively"
+    )
+    # reading headers doesn't need the dialects themselves
+    manifest_parser.set_defaults(run=_run_manifest, imports=[])
+
+    return parser
+
+
+def _add_import_option(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "-i",
+        "--import",
+        action="append",
+        default=[],
+        dest="imports",
+        metavar="MODULE",
+        help="import a module which registers dialects (may be repeated)",
+    )
+
+
+def _add_workers_option(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=1,
+        help="number of worker processes (0 means one per CPU)",
+    )
+
+
+def _run_compile(args: argparse.Namespace) -> int:
+    mode: Optional[PycInvalidationMode] = None
+    if args.invalidation_mode is not None:
+        mode = PycInvalidationMode[args.invalidation_mode.replace("-", "_").upper()]
+
+    failed = False
+    for result in precompile.compile_paths(
+        args.paths,
+        workers=args.workers,
+        force=args.force,
+        invalidation_mode=mode,
+        imports=args.imports,
+    ):
+        if result.status == "failed":
+            failed = True
+            print(f"Failed to compile {result.path!r}: {result.error}", file=sys.stderr)
+        elif result.status == "uncached":
+            print(f"Could not write {result.path!r} to the cache", file=sys.stderr)
+        elif result.status == "compiled" and not args.quiet:
+            print(f"Compiled {result.path!r}")
+    return 1 if failed else 0
+
+
+def _run_check(args: argparse.Namespace) -> int:
+    checked = failed = 0
+    for result in precompile.check_paths(
+        args.paths, workers=args.workers, imports=args.imports
+    ):
+        if result.status == "failed":
+            failed += 1
+            location = (
+                result.path if result.line is None else f"{result.path}:{result.line}"
+            )
+            print(f"{location}: {result.error}")
+        elif result.status == "checked":
+            checked += 1
+    print(f"Checked {checked + failed} modules, {failed} failed", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def _run_bundle(args: argparse.Namespace) -> int:
+    results = bundle.build_bundle(
+        args.output,
+        args.paths,
+        workers=args.workers,
+        imports=args.imports,
+        all_modules=args.all_modules,
+    )
+    failed = [r for r in results if r.status == "failed"]
+    for result in failed:
+        print(f"Failed to compile {result.path!r}: {result.error}", file=sys.stderr)
+    if failed:
+        return 1
+    count = sum(r.status == "bundled" for r in results)
+    print(f"Bundled {count} modules in {args.output!r}")
+    return 0
+
+
+def _run_manifest(args: argparse.Namespace) -> int:
+    try:
+        updated = manifest.update_manifests(args.paths)
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return 1
+    for directory in updated:
+        print(f"Updated manifest for {directory!r}")
+    return 0
+
+
+def _run_export(args: argparse.Namespace) -> int:
+    exported = failed = 0
+    for result in export.export_paths(
+        args.paths, args.output, workers=args.workers, imports=args.imports
+    ):
+        if result.status == "failed":
+            failed += 1
+            print(f"Failed to export {result.path!r}: {result.error}", file=sys.stderr)
+        elif result.status == "exported":
+            exported += 1
+    print(f"Exported {exported} modules to {args.output!r}")
+    return 1 if failed else 0
+
+
+def _run_serve(args: argparse.Namespace) -> int:
+    # imported here since it's only supported on some platforms
+    from . import server
+
+    print(f"Serving on {args.socket!r}", file=sys.stderr)
+    try:
+        server.serve(args.socket)
+    except KeyboardInterrupt:
+        pass
+    except OSError as error:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,280 @@
+"""Transpile and compile source which doesn't live in a module file.
+
+Source generated at runtime - templated rules or plugins for instance - can be turned
+into code without having to compile the tree from
+:func:`~pyalect.dialect.apply_dialects` yourself:
+
+.. code-block::
+
+    from pyalect import exec_source
+
+    namespace = exec_source(rule_source, "my_dialect", filename="<rule 12>")
+
+Code objects are kept in a bounded, least recently used cache shared by all threads, so
+evaluating the same source with the same dialects again skips transpiling and
+compiling it. See :func:`cache_info`.
+
+Large numbers of sources can be transpiled in parallel with
+:func:`apply_dialects_many`.
+"""
+
+import hashlib
+import itertools
+import marshal
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from types import CodeType
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from . import instrument
+from .dialect import _dialect_class, _split_dialect_names, apply_dialects
+from .errors import DialectError, reraise_dialect_error
+from .importer import decode_source
+from .precompile import _pool_size, process_pool
+
+DEFAULT_CACHE_SIZE = 256
+
+
+class CacheInfo(NamedTuple):
+    """Statistics about the code cache used by :func:`compile_source`."""
+
+    hits: int
+    """How many times code was found in the cache."""
+
+    misses: int
+    """How many times code had to be compiled."""
+
+    evictions: int
+    """How many entries were discarded to make room for others."""
+
+    maxsize: int
+    """The most entries the cache may hold."""
+
+    currsize: int
+    """The number of entries the cache holds now."""
+
+
+def compile_source(
+    source: Union[str, bytes],
+    dialects: Union[str, Iterable[str]],
+    filename: str = "<string>",
+    cache: bool = True,
+    optimize: int = -1,
+) -> CodeType:
+    """Transpile source with the given dialects and compile it to module code.
+
+    Parameters:
+        source: the source to transpile - bytes are decoded like a module file.
+        dialects: the dialects to apply, in order.
+        filename: the name tracebacks and dialects refer to.
+        cache: whether to look up and store the code in the cache. It's keyed on the
+            source, the dialect classes currently registered under the given names,
+            the filename, and the optimization level.
+        optimize: the optimization level, as for :func:`compile` - ``-1`` means the
+            level of the interpreter (see :data:`sys.flags`).
+    """
+    if optimize == -1:
+        optimize = sys.flags.optimize
+    if not cache:
+        return _compile(source, dialects, filename, optimize)
+
+    names = list(_split_dialect_names(dialects))
+    key = (
+        _source_digest(source),
+        tuple(_dialect_class(name) for name in names),
+        filename,
+        optimize,
+    )
+    with _LOCK:
+        code = _CACHE.get(key)
+        if code is not None:
+            _CACHE.move_to_end(key)
+            _STATS["hits"] += 1
+            return code
+        _STATS["misses"] += 1
+
+    # compiled without holding the lock - at worst the same code is compiled twice
+    code = _compile(source, names, filename, optimize)
+    with _LOCK:
+        if _MAXSIZE:
+            _CACHE[key] = code
+            _evict(_MAXSIZE)
+    return code
+
+
+def exec_source(
+    source: Union[str, bytes],
+    dialects: Union[str, Iterable[str]],
+    namespace: Optional[Dict[str, Any]] = None,
+    filename: str = "<string>",
+) -> Dict[str, Any]:
+    """Execute source transpiled with the given dialects - see :func:`compile_source`.
+
+    Returns:
+        The namespace the code was executed in - a new one unless it was given.
+    """
+    if namespace is None:
+        namespace = {}
+    exec(compile_source(source, dialects, filename), namespace)
+    return namespace
+
+
+class BatchResult(NamedTuple):
+    """The outcome of transpiling one item given to :func:`apply_dialects_many`."""
+
+    position: int
+    """The position of the item in the iterable that was given."""
+
+    filename: str
+    """The filename the item was compiled with."""
+
+    code: Union[CodeType, bytes, None]
+    """The compiled code (marshalled if requested), or ``None`` if it failed."""
+
+    error: Optional[DialectError] = None
+    """Why the item failed - errors other than a :class:`~pyalect.errors.DialectError`
+    (a :class:`SyntaxError` for instance) are converted to one."""
+
+
+def apply_dialects_many(
+    items: Iterable[Tuple[Union[str, bytes], Union[str, Iterable[str]], Optional[str]]],
+    workers: int = 0,
+    imports: Sequence[str] = (),
+    marshalled: bool = False,
+    max_pending: Optional[int] = None,
+) -> Iterator[BatchResult]:
+    """Transpile and compile many sources in parallel.
+
+    Items are only taken from the iterable as workers become free, so it may be a
+    generator of any length. A failure doesn't stop the rest of the batch.
+
+    Parameters:
+        items: ``(source, dialects, filename)`` tuples - the filename may be ``None``.
+        workers: the number of processes to use (``0`` means one per CPU, and ``1``
+            works in this process).
+        imports: modules to import in each worker before compiling - these should
+            register the dialects which are needed.
+        marshalled: yield code serialized by :func:`marshal.dumps` rather than code
+            objects (e.g. to write it somewhere).
+        max_pending: the most items which may be in progress at once - by default
+            four per worker.
+
+    Yields:
+        A :class:`BatchResult` for each item, in the order they finish.
+    """
+    limit = max_pending or 4 * _pool_size(workers)
+    remaining = enumerate(items)
+    pending: "Dict[Future[Tuple[Optional[bytes], Optional[DialectError]]], int]" = {}
+    filenames: Dict[int, str] = {}
+    with process_pool(workers, imports) as executor:
+        while True:
+            for index, (source, names, filename) in itertools.islice(
+                remaining, limit - len(pending)
+            ):
+                filenames[index] = filename or "<string>"
+                if not isinstance(names, str):
+                    names = list(names)
+                future = executor.submit(_compile_item, source, names, filenames[index])
+                pending[future] = index
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=pending.__getitem__):
+                index = pending.pop(future)
+                data, error = future.result()
+                code: Union[CodeType, bytes, None] = data
+                if data is not None and not marshalled:
+                    code = marshal.loads(data)
+                yield BatchResult(index, filenames.pop(index), code, error)
+
+
+def cache_info() -> CacheInfo:
+    """Report how effective the cache used by :func:`compile_source` has been."""
+    with _LOCK:
+        return CacheInfo(
+            _STATS["hits"], _STATS["misses"], _STATS["evictions"], _MAXSIZE, len(_CACHE)
+        )
+
+
+def cache_clear() -> None:
+    """Empty the cache used by :func:`compile_source` and reset its statistics."""
+    with _LOCK:
+        _CACHE.clear()
+        _STATS.update(hits=0, misses=0, evictions=0)
+
+
+def set_cache_size(maxsize: int) -> None:
+    """Change the most entries the cache may hold (``0`` disables it)."""
+    global _MAXSIZE
+    if maxsize < 0:
+        raise ValueError(f"Expected a cache size of at least 0, not {maxsize}")
+    with _LOCK:
+        _MAXSIZE = maxsize
+        _evict(maxsize)
+
+
+def _compile(
+    source: Union[str, bytes],
+    dialects: Union[str, Iterable[str]],
+    filename: str,
+    optimize: int,
+) -> CodeType:
+    if isinstance(source, bytes):
+        source = decode_source(source)
+    try:
+        tree = apply_dialects(source, dialects, filename)
+    except DialectError:
+        reraise_dialect_error()
+    with instrument.measure("compile"):
+        code: CodeType = compile(  # type: ignore
+            tree, filename, "exec", optimize=optimize
+        )
+    return code
+
+
+def _compile_item(
+    source: Union[str, bytes], dialects: Union[str, Iterable[str]], filename: str
+) -> Tuple[Optional[bytes], Optional[DialectError]]:
+    # code objects can't be pickled and errors might not be - send back neither
+    try:
+        code = compile_source(source, dialects, filename, cache=False)
+    except DialectError as error:
+        return None, DialectError(str(error), error.filename, error.line)
+    except SyntaxError as error:
+        message = f"{type(error).__name__}: {error.msg}"
+        return None, DialectError(message, error.filename or filename, error.lineno)
+    except Exception as error:
+        return None, DialectError(f"{type(error).__name__}: {error}", filename)
+    return marshal.dumps(code), None
+
+
+def _source_digest(source: Union[str, bytes]) -> bytes:
+    if isinstance(source, str):
+        source = source.encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(source, digest_size=16).digest()
+
+
+def _evict(maxsize: int) -> None:
+    while len(_CACHE) > maxsize:
+        _CACHE.popitem(last=False)
+        _STATS["evictions"] += 1
+
+
+_LOCK = threading.Lock()
+_MAXSIZE = DEFAULT_CACHE_SIZE
+_CACHE: "OrderedDict[Tuple[bytes, Tuple[type, ...], str, int], CodeType]" = (
+    OrderedDict()
+)
+_STATS = {"hits": 0, "misses": 0, "evictions": 0}
@@ -1,25 +1,76 @@
 import ast
+import codecs
+import functools
+import hashlib
+import inspect
 import io
 import re
+import threading
 import tokenize
+import weakref
 from pathlib import Path
 from typing import (
+    Any,
+    Callable,
+    Collection,
     Dict,
+    FrozenSet,
     Iterable,
     Iterator,
     List,
+    NamedTuple,
     Optional,
     Sequence,
     Set,
+    Tuple,
     Type,
     Union,
     overload,
 )
 
+from . import instrument
+
 DIALECT_COMMENT = re.compile(r"^# ?dialect *= *(\w+(?: *, *\w+)*)\n?$")
 DIALECT_NAME = re.compile(r"^\w+$")
+ENTRY_POINT_GROUP = "pyalect.dialects"
+"""Packages may register dialects under this entry point group - they're imported
+only once a module which uses them is imported (or their fingerprint is needed)."""
+
+# The header scan reads this many bytes at first, doubling up to the limit
+# before falling back to the tokenizer (e.g. for very long docstrings).
+_HEADER_CHUNK_SIZE = 4096
+_HEADER_SIZE_LIMIT = 1 << 20
+
+_HEADER_TOKEN = re.compile(rb"[#'\"\\\r\n()\[\]{}]")
+_CODING_COOKIE = re.compile(rb"[ \t\f]*#.*?coding[:=][ \t]*([-\w.]+)")
+_BLANK_OR_COMMENT = re.compile(rb"[ \t\f]*(?:[#\r\n]|$)")
+_NOT_BLANK = re.compile(rb"[^ \t\f]")
+_STRING_END = {
+    b"'": re.compile(rb"(?:[^'\\\n]|\\.)*'", re.DOTALL),
+    b'"': re.compile(rb'(?:[^"\\\n]|\\.)*"', re.DOTALL),
+}
+# Skips over anything inside brackets that isn't a comment, bracket, or f-string.
+_BRACKETED_CONTENT = re.compile(
+    rb"(?:"
+    rb"[^#'\"\\\r()\[\]{}]+"
+    rb"|(?<![fFtT])(?<![fFtT][rRbB])(?:"
+    rb"'''(?:[^'\\]|\\.|'(?!''))*'''"
+    rb'|"""(?:[^"\\]|\\.|"(?!""))*"""'
+    rb"|'(?!'')(?:[^'\\\n]|\\.)*'"
+    rb'|"(?!"")(?:[^"\\\n]|\\.)*"'
+    rb")"
+    rb"|\\\r?\n"
+    rb")*",
+    re.DOTALL,
+)
 
-_REGISTERED_DIALECTS: Dict[str, Type["Dialect"]] = {}
+_REGISTERED_DIALECTS: Dict[str, Union[Type["Dialect"], "_DialectReference"]] = {}
+_ENTRY_POINTS_LOADED = False
+_SETUP_DIALECTS: "weakref.WeakSet[Type[Dialect]]" = weakref.WeakSet()
+_SETUP_LOCK = threading.RLock()
+_DIALECT_FINGERPRINTS: "weakref.WeakKeyDictionary[Type[Dialect], Optional[str]]" = (
+    weakref.WeakKeyDictionary()
+)
 
 
 def find_file_dialects(filename: Union[str, Path]) -> List[str]:
@@ -64,6 +115,14 @@ def find_source_dialects(source: Union[bytes, str, io.FileIO]) -> List[str]:
         buffer = io.BytesIO(source)
     else:
         raise TypeError(f"Expected bytes, str, or FileIO not {source!r}")
+
+    start = buffer.tell()
+    dialects = _read_header_dialects(buffer)
+    if dialects is not None:
+        return dialects
+
+    # the fast path wasn't sure - let the tokenizer decide
+    buffer.seek(start)
     for token in tokenize.tokenize(buffer.readline):
         if token.type == tokenize.NEWLINE:
             break
@@ -96,7 +155,9 @@ class Dialect:
 
         A transpiler instance is only used **once** per module and **shouldn't** be
         reused. This means that a :class:`Dialect` can keep state between calls to
-        :meth:`Dialect.transform_src` and :meth:`Dialect.transform_ast`
+        :meth:`Dialect.transform_src` and :meth:`Dialect.transform_ast` - unless it
+        sets :attr:`Dialect.reusable`. Expensive preparation which doesn't depend on
+        the module belongs in :meth:`Dialect.setup`.
 
     Parameters:
         filename: the name of the file being transpiled.
@@ -104,7 +165,43 @@ class Dialect:
 
     name: str
 
+    version: Optional[str] = None
+    """Identifies the implementation of this dialect for cached bytecode.
+
+    When left as ``None`` a hash of the source file which defines the dialect is used
+    instead. See :func:`dialect_fingerprint` for more info.
+    """
+
+    stages: Optional[Collection[str]] = None
+    """The stages this dialect takes part in - ``"src"`` and/or ``"ast"``.
+
+    When left as ``None`` the stages are inferred from the methods the dialect
+    overrides: :meth:`transform_src` or :meth:`transform_tokens` for ``"src"``, and
+    :meth:`transform_ast` for ``"ast"``. A :class:`DialectReducer` doesn't call a
+    dialect's methods for the other stages.
+    """
+
+    reusable: bool = False
+    """Whether one instance of this dialect may be used for every module.
+
+    Set this if the dialect keeps no state between calls to its methods. The shared
+    instance is created without a :attr:`filename`.
+    """
+
+    @classmethod
+    def setup(cls) -> None:
+        """Implement this method to prepare the dialect before it's first used.
+
+        This is called once per process, before the first instance is created by
+        :func:`dialect` or its fingerprint is computed by :func:`dialect_fingerprint`
+        - it's the place to load grammars, build lookup tables, or read
+        configuration. It may also set :attr:`version`. If it raises, it's called
+        again the next time.
+        """
+
     def __init_subclass__(cls, name: Optional[str] = None) -> None:
+        if cls.stages is not None and not set(cls.stages).issubset(_STAGES):
+            raise ValueError(f"Expected stages from {_STAGES}, not {cls.stages!r}")
         if name is not None:
             cls.name = name
         if getattr(cls, "name", None) is not None:
@@ -115,13 +212,53 @@ class Dialect:
 
     def transform_src(self, source: str) -> str:
         """Implement this method to transform a raw Python source string."""
+        if _uses_tokens(type(self)):
+            return _transform_tokens(source, [self])
         return source
 
+    def transform_tokens(
+        self, tokens: Iterator[tokenize.TokenInfo]
+    ) -> Iterator[tokenize.TokenInfo]:
+        """Implement this method (instead of :meth:`transform_src`) to transform the
+        tokens of the source, as produced by :func:`tokenize.generate_tokens`.
+
+        The source is tokenized once for consecutive dialects which implement this
+        method, each one's tokens are passed to the next, and the result is joined
+        with :func:`tokenize.untokenize` (so the same rules apply to the tokens which
+        are yielded). Stacking dialects this way avoids creating a copy of the whole
+        source for each one.
+        """
+        return tokens
+
     def transform_ast(self, node: ast.AST) -> ast.AST:
         """Implement this method to transform an :class:`~ast.AST`."""
         return node
 
 
+class VisitorDialect(Dialect):
+    """A :class:`Dialect` which transforms an AST one node at a time.
+
+    Define ``visit_<NodeType>`` methods as you would for an :class:`ast.NodeTransformer`
+    - they may return a new node, ``None`` to remove the node, or a list of nodes when
+    the node is part of a list (e.g. a statement). Unlike a node transformer each
+    method receives a node whose children have already been visited, so it should not
+    call ``generic_visit``.
+
+    When several visitor dialects are applied in a row (and don't override
+    :meth:`Dialect.transform_ast`) a :class:`DialectReducer` visits the tree only once,
+    passing each node to every interested dialect in order.
+
+    .. code-block::
+
+        class Double(VisitorDialect, name="double"):
+            def visit_Constant(self, node):
+                return ast.Constant(node.value * 2)
+    """
+
+    def transform_ast(self, node: ast.AST) -> ast.AST:
+        return _visit_tree(node, [self])
+
+
 class DialectReducer(Sequence[Dialect]):
     """A reducer for applying many dialects at once.
 
@@ -131,6 +268,7 @@ class DialectReducer(Sequence[Dialect]):
 
     def __init__(self, dialects: Iterable[Dialect]):
         self._dialects = tuple(dialects)
+        self._plan = _plan(tuple(type(d) for d in self._dialects))
 
     @overload
     def __getitem__(self, index: int) -> Dialect:
@@ -150,17 +288,39 @@ class DialectReducer(Sequence[Dialect]):
         return len(self._dialects)
 
     def transform_src(self, source: str) -> str:
-        """Transform raw Python source code using the contained dialects."""
-        for d in self._dialects:
-            source = d.transform_src(source)
+        """Transform raw Python source code using the contained dialects.
+
+        Dialects which don't take part in the ``"src"`` stage (see
+        :attr:`Dialect.stages`) are skipped. Consecutive dialects which implement
+        :meth:`Dialect.transform_tokens` share one tokenization of the source.
+        """
+        for kind, indices in self._plan.src:
+            if kind == "tokens":
+                source = _transform_tokens(source, self._select(indices))
+            else:
+                d = self._dialects[indices[0]]
+                with instrument.measure("transform_src", d.name):
+                    source = d.transform_src(source)
         return source
 
     def transform_ast(self, node: ast.AST) -> ast.AST:
-        """Transform an AST tree using the contained dialects."""
-        for d in self._dialects:
-            node = d.transform_ast(node)
+        """Transform an AST tree using the contained dialects.
+
+        Dialects which don't take part in the ``"ast"`` stage are skipped.
+        Consecutive :class:`VisitorDialect` instances are applied in one traversal.
+        """
+        for kind, indices in self._plan.ast:
+            if kind == "visit":
+                node = _visit_fused(node, self._select(indices))
+            else:
+                d = self._dialects[indices[0]]
+                with instrument.measure("transform_ast", d.name):
+                    node = d.transform_ast(node)
         return node
 
+    def _select(self, indices: Tuple[int, ...]) -> List[Dialect]:
+        return [self._dialects[i] for i in indices]
+
 
 def apply_dialects(
     source: str, names: Union[str, Iterable[str]], filename: Optional[str] = None
@@ -168,8 +328,9 @@ def apply_dialects(
     """Utility for applying dialect transpilers to source code."""
     reducer = dialect_reducer(names, filename)
     source = reducer.transform_src(source)
-    tree = reducer.transform_ast(ast.parse(source))
-    return tree
+    with instrument.measure("parse"):
+        tree = ast.parse(source)
+    return reducer.transform_ast(tree)
 
 
 def dialect_reducer(
@@ -196,24 +357,52 @@ def dialect(name: str, filename: Optional[str]) -> Dialect:
         name: The dialect name
         filename: The name of the file the :class:`Dialect` will be used on.
     """
-    if name in _REGISTERED_DIALECTS:
-        return _REGISTERED_DIALECTS[name](filename)
-    else:
-        raise ValueError(f"Unknown dialect {name!r}")
+    cls = _dialect_class(name)
+    shared: Optional[Dialect] = cls.__dict__.get("_shared_instance")
+    if shared is not None:
+        return shared
+    if cls not in _SETUP_DIALECTS:
+        _setup_dialect(cls)
+    if cls.reusable:
+        return _shared_instance(cls)
+    return cls(filename)
+
+
+def dialect_fingerprint(name: str) -> Optional[str]:
+    """Identify the implementation of a registered dialect.
+
+    The fingerprint changes whenever :attr:`Dialect.version` or, if no version was
+    given, the source of the module defining the dialect changes. If neither is
+    available ``None`` is returned and bytecode using the dialect should not be cached.
+    """
+    cls = _dialect_class(name)
+    if cls not in _SETUP_DIALECTS:
+        # setup may determine the version
+        _setup_dialect(cls)
+    if cls not in _DIALECT_FINGERPRINTS:
+        _DIALECT_FINGERPRINTS[cls] = _make_fingerprint(cls)
+    return _DIALECT_FINGERPRINTS[cls]
 
 
 def registered() -> Set[str]:
-    """The set of dialect names already registered."""
+    """The set of dialect names already registered (including via entry points)."""
+    _load_entry_points()
     return set(_REGISTERED_DIALECTS)
 
 
 def register(dialect: Type[Dialect]) -> Type[Dialect]:
-    """Register a :class:`Dialect` so it will be applied to imported modules."""
+    """Register a :class:`Dialect` so it will be applied to imported modules.
+
+    Dialects may also be registered by installed packages without being imported -
+    see :data:`ENTRY_POINT_GROUP`. Registering a class replaces such an entry point.
+    """
     if not issubclass(dialect, Dialect):
         raise TypeError(f"Expected a 'Dialect' not {dialect}")
     if getattr(dialect, "name", None) is None:
         raise ValueError(f"Dialect {dialect} has no name defined")
-    elif dialect.name in _REGISTERED_DIALECTS:
+    elif dialect.name in _REGISTERED_DIALECTS and not isinstance(
+        _REGISTERED_DIALECTS[dialect.name], _DialectReference
+    ):
         msg = f"Already registered {_REGISTERED_DIALECTS[dialect.name]!r} as {dialect.name!r}"
         raise ValueError(msg)
     _REGISTERED_DIALECTS[_check_valid_dialect_name(dialect.name)] = dialect
@@ -226,6 +415,7 @@ def deregister(*dialects: Union[Type[Dialect], Iterable[str], str],) -> None:
     Parameters:
         dialects: the dialect name, or class
     """
+    _load_entry_points()
     if not dialects:
         _REGISTERED_DIALECTS.clear()
         return None
@@ -249,6 +439,426 @@ def deregister(*dialects: Union[Type[Dialect], Iterable[str], str],) -> None:
             raise TypeError(f"Expected a string, or Dialect subclass, not {dia}")
 
 
+class _DialectReference:
+    """A dialect registered by an entry point which hasn't been imported yet."""
+
+    def __init__(self, name: str, entry_point: Any) -> None:
+        self.name = name
+        self.entry_point = entry_point
+
+    def load(self) -> Type[Dialect]:
+        cls = self.entry_point.load()
+        if not (isinstance(cls, type) and issubclass(cls, Dialect)):
+            raise TypeError(f"Entry point {self.name!r} is not a 'Dialect' - {cls!r}")
+        if getattr(cls, "name", None) != self.name:
+            raise ValueError(
+                f"Entry point {self.name!r} refers to {cls} not {self.name!r}"
+            )
+        return cls
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.name!r}, {self.entry_point.value!r})"
+
+
+def _dialect_class(name: str) -> Type[Dialect]:
+    if name not in _REGISTERED_DIALECTS:
+        _load_entry_points()
+    try:
+        cls = _REGISTERED_DIALECTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown dialect {name!r}")
+    if isinstance(cls, _DialectReference):
+        # importing the dialect's module normally registers it anyway
+        cls = _REGISTERED_DIALECTS[name] = cls.load()
+    return cls
+
+
+def _setup_dialect(cls: Type[Dialect]) -> None:
+    with _SETUP_LOCK:
+        if cls not in _SETUP_DIALECTS:
+            cls.setup()
+            _SETUP_DIALECTS.add(cls)
+
+
+def _shared_instance(cls: Type[Dialect]) -> Dialect:
+    with _SETUP_LOCK:
+        # stored on the class itself so it doesn't keep a deregistered class alive
+        shared: Optional[Dialect] = cls.__dict__.get("_shared_instance")
+        if shared is None:
+            shared = cls()
+            setattr(cls, "_shared_instance", shared)
+        return shared
+
+
+def _load_entry_points() -> None:
+    global _ENTRY_POINTS_LOADED
+    if _ENTRY_POINTS_LOADED:
+        return None
+    _ENTRY_POINTS_LOADED = True
+    for entry_point in _dialect_entry_points():
+        if DIALECT_NAME.match(entry_point.name):
+            _REGISTERED_DIALECTS.setdefault(
+                entry_point.name, _DialectReference(entry_point.name, entry_point)
+            )
+
+
+def _dialect_entry_points() -> Iterable[Any]:
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # pragma: no cover
+        try:
+            from importlib_metadata import entry_points  # type: ignore
+        except ImportError:
+            return []
+    found = entry_points()
+    if hasattr(found, "select"):
+        return found.select(group=ENTRY_POINT_GROUP)
+    else:  # pragma: no cover
+        return found.get(ENTRY_POINT_GROUP, [])  # type: ignore
+
+
+_STAGES = ("src", "ast")
+
+# (kind, dialect indices) - "tokens" and "visit" steps apply several dialects at once
+_Step = Tuple[str, Tuple[int, ...]]
+
+
+class _Plan(NamedTuple):
+    src: Tuple[_Step, ...]
+    ast: Tuple[_Step, ...]
+
+
+@functools.lru_cache(maxsize=256)
+def _plan(classes: Tuple[Type[Dialect], ...]) -> _Plan:
+    src_steps: List[_Step] = []
+    ast_steps: List[_Step] = []
+    for index, cls in enumerate(classes):
+        stages = _dialect_stages(cls)
+        if "src" in stages:
+            _add_step(src_steps, "tokens" if _uses_tokens(cls) else "src", index)
+        if "ast" in stages:
+            _add_step(ast_steps, "visit" if _is_fusable(cls) else "ast", index)
+    return _Plan(tuple(src_steps), tuple(ast_steps))
+
+
+def _add_step(steps: List[_Step], kind: str, index: int) -> None:
+    # skipped dialects don't separate those which can be grouped
+    if kind in ("tokens", "visit") and steps and steps[-1][0] == kind:
+        steps[-1] = (kind, steps[-1][1] + (index,))
+    else:
+        steps.append((kind, (index,)))
+
+
+def _dialect_stages(cls: Type[Dialect]) -> FrozenSet[str]:
+    if cls.stages is not None:
+        return frozenset(cls.stages)
+    stages = set()
+    if (
+        cls.transform_src is not Dialect.transform_src
+        or cls.transform_tokens is not Dialect.transform_tokens
+    ):
+        stages.add("src")
+    if cls.transform_ast is not Dialect.transform_ast:
+        stages.add("ast")
+    return frozenset(stages)
+
+
+def _uses_tokens(cls: Type[Dialect]) -> bool:
+    return (
+        cls.transform_tokens is not Dialect.transform_tokens
+        and cls.transform_src is Dialect.transform_src
+    )
+
+
+def _transform_tokens(source: str, dialects: Sequence[Dialect]) -> str:
+    with instrument.measure("transform_src", "+".join(d.name for d in dialects)):
+        tokens: Iterator[tokenize.TokenInfo] = tokenize.generate_tokens(
+            io.StringIO(source).readline
+        )
+        for d in dialects:
+            tokens = d.transform_tokens(tokens)
+        new_source: str = tokenize.untokenize(tokens)
+        return new_source
+
+
+def _is_fusable(cls: Type[Dialect]) -> bool:
+    return (
+        issubclass(cls, VisitorDialect)
+        and cls.transform_ast is VisitorDialect.transform_ast
+    )
+
+
+def _visit_fused(tree: ast.AST, dialects: Sequence[Dialect]) -> ast.AST:
+    with instrument.measure("transform_ast", "+".join(d.name for d in dialects)):
+        return _visit_tree(tree, dialects)
+
+
+_NodeVisitResult = Union[ast.AST, List[ast.AST], None]
+_NodeVisitor = Callable[[ast.AST], _NodeVisitResult]
+
+
+def _visit_tree(tree: ast.AST, dialects: Sequence[Dialect]) -> ast.AST:
+    new_tree = _FusedVisit(dialects).visit(tree, 0)
+    if not isinstance(new_tree, ast.AST):
+        raise TypeError(
+            f"Expected the root node to be replaced by a node, not {new_tree}"
+        )
+    return new_tree
+
+
+class _FusedVisit:
+    """Visits each node with every dialect in turn, in a single traversal."""
+
+    def __init__(self, dialects: Sequence[Dialect]) -> None:
+        self.dialects = dialects
+        self._visitors: Dict[str, Optional[List[Optional[_NodeVisitor]]]] = {}
+        # nodes every dialect is done with - nodes from a dialect's replacement are
+        # visited by the dialects after it, except for these
+        self._finished: Set[ast.AST] = set()
+
+    def visit(self, node: ast.AST, start: int) -> _NodeVisitResult:
+        if start and node in self._finished:
+            return node
+        self._visit_fields(node, start)
+        methods = self._node_visitors(node)
+        if methods is not None:
+            for index in range(start, len(self.dialects)):
+                method = methods[index]
+                if method is None:
+                    continue
+                result = method(node)
+                if result is not node:
+                    return self._visit_replacement(result, index + 1)
+        self._finished.add(node)
+        return node
+
+    def _visit_fields(self, node: ast.AST, start: int) -> None:
+        for field, old_value in ast.iter_fields(node):
+            if isinstance(old_value, list):
+                new_values: List[Any] = []
+                for value in old_value:
+                    if isinstance(value, ast.AST):
+                        value = self.visit(value, start)
+                        if value is None:
+                            continue
+                        elif not isinstance(value, ast.AST):
+                            new_values.extend(value)
+                            continue
+                    new_values.append(value)
+                old_value[:] = new_values
+            elif isinstance(old_value, ast.AST):
+                new_node = self.visit(old_value, start)
+                if new_node is None:
+                    delattr(node, field)
+                else:
+                    setattr(node, field, new_node)
+
+    def _visit_replacement(
+        self, result: _NodeVisitResult, start: int
+    ) -> _NodeVisitResult:
+        nodes = [result] if isinstance(result, ast.AST) else result or []
+        if start == len(self.dialects):
+            self._finished.update(nodes)
+            return result
+        elif isinstance(result, ast.AST):
+            return self.visit(result, start)
+        new_nodes: List[ast.AST] = []
+        for node in nodes:
+            new_node = self.visit(node, start)
+            if isinstance(new_node, ast.AST):
+                new_nodes.append(new_node)
+            elif new_node is not None:
+                new_nodes.extend(new_node)
+        return None if result is None else new_nodes
+
+    def _node_visitors(self, node: ast.AST) -> Optional[List[Optional[_NodeVisitor]]]:
+        name = type(node).__name__
+        if name not in self._visitors:
+            methods = [getattr(d, "visit_" + name, None) for d in self.dialects]
+            self._visitors[name] = methods if any(methods) else None
+        return self._visitors[name]
+
+
+def _read_header_dialects(buffer: Union[io.FileIO, io.BytesIO]) -> Optional[List[str]]:
+    data = b""
+    size = _HEADER_CHUNK_SIZE
+    while True:
+        data += buffer.read(size - len(data)) or b""
+        try:
+            return _scan_header_dialects(data, len(data) < size)
+        except _NeedMoreSource:
+            if size >= _HEADER_SIZE_LIMIT:
+                return None
+            size *= 2
+
+
+class _NeedMoreSource(Exception):
+    """The header continues past the end of the scanned prefix."""
+
+
+class _UnusualSource(Exception):
+    """The source does something the header scan doesn't handle."""
+
+
+def _scan_header_dialects(source: bytes, complete: bool) -> Optional[List[str]]:
+    """Find dialects in the header of (a prefix of) some source without tokenizing it.
+
+    Returns ``None`` if the source does something unusual, in which case the tokenizer
+    should be used instead. Raises :class:`_NeedMoreSource` if the prefix ended in a
+    long comment header, docstring, or line, but not inside brackets - scanning those
+    in Python is slower than tokenizing.
+    """
+    if source.startswith(codecs.BOM_UTF8):
+        source = source[len(codecs.BOM_UTF8) :]
+        bom = True
+    else:
+        bom = False
+
+    try:
+        encoding = _find_header_encoding(source, bom)
+        return _scan_header_tokens(source, complete, encoding)
+    except _UnusualSource:
+        return None
+
+
+def _find_header_encoding(source: bytes, bom: bool) -> str:
+    line_start = 0
+    for _ in range(2):
+        line_end = source.find(b"\n", line_start)
+        if line_end == -1:
+            line_end = len(source)
+        cookie = _CODING_COOKIE.match(source, line_start, line_end)
+        if cookie is not None:
+            try:
+                encoding = codecs.lookup(cookie.group(1).decode()).name
+            except LookupError:
+                raise _UnusualSource()
+            if bom and encoding != "utf-8":
+                raise _UnusualSource()
+            return encoding
+        elif not _BLANK_OR_COMMENT.match(source, line_start, line_end):
+            break
+        line_start = line_end + 1
+    return "utf-8"
+
+
+def _scan_header_tokens(source: bytes, complete: bool, encoding: str) -> List[str]:
+    index = 0
+    depth = 0
+    has_code = False
+    while True:
+        if depth:
+            index = _skip_bracketed_content(source, index)
+        match = _HEADER_TOKEN.search(source, index)
+        end = len(source) if match is None else match.start()
+        if source[index:end].strip(b" \t\f"):
+            has_code = True
+        if match is None:
+            if complete and depth == 0:
+                return []
+            raise _need_more_source(complete, depth)
+
+        char = match.group()
+        index = match.end()
+        if char == b"#":
+            dialects, index = _scan_comment(source, match.start(), complete, encoding)
+            if dialects:
+                return dialects
+        elif char == b"\n":
+            if has_code and depth == 0:
+                return []
+        elif char == b"\r":
+            if source[index : index + 1] != b"\n":
+                raise _UnusualSource()
+        elif char == b"\\":
+            index = _skip_line_continuation(source, index)
+            if not has_code or not _NOT_BLANK.search(source, index):
+                # the tokenizer treats a continuation before any code differently,
+                # and fails if nothing follows it
+                raise _UnusualSource()
+        elif char in b"([{":
+            has_code = True
+            depth += 1
+        elif char in b")]}":
+            depth -= 1
+            if depth < 0:
+                raise _UnusualSource()
+        else:
+            has_code = True
+            index = _skip_string(source, match.start(), complete, depth)
+
+
+def _scan_comment(
+    source: bytes, start: int, complete: bool, encoding: str
+) -> Tuple[List[str], int]:
+    end = source.find(b"\n", start)
+    if end == -1:
+        if not complete:
+            raise _need_more_source(complete, 0)
+        end = len(source)
+    try:
+        comment = source[start:end].rstrip(b"\r").decode(encoding)
+    except UnicodeDecodeError:
+        raise _UnusualSource()
+    match = DIALECT_COMMENT.match(comment)
+    if match is None:
+        return [], end
+    return list(map(str.strip, match.groups()[0].split(","))), end
+
+
+def _skip_line_continuation(source: bytes, index: int) -> int:
+    if source[index : index + 1] == b"\n":
+        return index + 1
+    elif source[index : index + 2] == b"\r\n":
+        return index + 2
+    else:
+        raise _UnusualSource()
+
+
+def _skip_bracketed_content(source: bytes, index: int) -> int:
+    match = _BRACKETED_CONTENT.match(source, index)
+    return index if match is None else match.end()
+
+
+def _skip_string(source: bytes, start: int, complete: bool, depth: int) -> int:
+    prefix_start = start
+    while source[prefix_start - 1 : prefix_start].isalpha():
+        prefix_start -= 1
+    prefix = source[prefix_start:start].lower()
+    if b"f" in prefix or b"t" in prefix:
+        raise _UnusualSource()  # f-strings and t-strings may nest quotes
+
+    quote = source[start : start + 1]
+    end: Optional[int]
+    if source[start : start + 3] == quote * 3:
+        end = _find_triple_quote_end(source, start + 3, quote * 3)
+    else:
+        match = _STRING_END[quote].match(source, start + 1)
+        end = None if match is None else match.end()
+    if end is None:
+        raise _need_more_source(complete, depth)
+    return end
+
+
+def _find_triple_quote_end(source: bytes, index: int, quote: bytes) -> Optional[int]:
+    while True:
+        end = source.find(quote, index)
+        if end == -1:
+            return None
+        escape = end
+        while source[escape - 1 : escape] == b"\\":
+            escape -= 1
+        if (end - escape) % 2 == 0:
+            return end + 3
+        index = end + 1
+
+
+def _need_more_source(complete: bool, depth: int) -> Exception:
+    if complete or depth:
+        return _UnusualSource()
+    return _NeedMoreSource()
+
+
 def _split_dialect_names(dialects: Union[str, Iterable[str]]) -> Iterator[str]:
     if not isinstance(dialects, str):
         dialect_iter = dialects
@@ -258,6 +868,18 @@ def _split_dialect_names(dialects: Union[str, Iterable[str]]) -> Iterator[str]:
         yield _check_valid_dialect_name(dia)
 
 
+def _make_fingerprint(cls: Type[Dialect]) -> Optional[str]:
+    qualname = f"{cls.__module__}.{cls.__qualname__}"
+    if cls.version is not None:
+        return f"{qualname}:{cls.version}"
+    try:
+        with open(inspect.getfile(cls), "rb") as f:
+            digest = hashlib.sha1(f.read()).hexdigest()
+    except (OSError, TypeError):
+        return None
+    return f"{qualname}:{digest}"
+
+
 def _check_valid_dialect_name(name: str) -> str:
     if not DIALECT_NAME.match(name):
         raise ValueError(f"Invalid dialect name {name!r}")
@@ -1,6 +1,6 @@
 import sys
 from types import CodeType
-from typing import Any, Optional
+from typing import Any, Dict, Optional, Tuple
 
 
 class DialectError(Exception):
@@ -13,9 +13,13 @@ class DialectError(Exception):
         self.filename = filename or "<string>"
         self.line = line or 1
 
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # keep the filename and line when sent to or from another process
+        return type(self), (self.args[0], self.filename, self.line)
+
 
 def reraise_dialect_error() -> None:
-    """Reraise an exception """
+    """Reraise a :class:`DialectError` so its traceback ends at its file and line."""
     exc_info = sys.exc_info()
 
     if exc_info[1] is None:
@@ -27,39 +31,14 @@ def reraise_dialect_error() -> None:
 
     exc_value: DialectError = exc_info[1]
 
-    # and fake the exception
-    line_shift = "\n" * (exc_value.line - 1)
-    raise_expr = "raise RuntimeError('dialect failed')"
-    code = compile(line_shift + raise_expr, exc_value.filename, "exec")
-
+    location = "<module>"
     if exc_value.__traceback__ is not None:
         location = exc_value.__traceback__.tb_frame.f_code.co_name
-        # depending on implementation changing the
-        # location might not work so we have to try it
-        try:
-            code = CodeType(
-                0,
-                code.co_kwonlyargcount,
-                code.co_nlocals,
-                code.co_stacksize,
-                code.co_flags,
-                code.co_code,
-                code.co_consts,
-                code.co_names,
-                code.co_varnames,
-                exc_value.filename,
-                location,
-                code.co_firstlineno,
-                code.co_lnotab,
-                (),
-                (),
-            )
-        except Exception:
-            pass
 
-    # execute the code and catch the new traceback
+    # execute code that appears to come from the given file and line then take its
+    # traceback - this way the error is shown alongside the offending source
     try:
-        exec(code, {}, {})
+        exec(_raise_at(exc_value.filename, exc_value.line, location), {}, {})
     except Exception:
         new_exc_info = sys.exc_info()
         if new_exc_info[2] is None:
@@ -68,3 +47,22 @@ def reraise_dialect_error() -> None:
 
     # return without this frame
     raise exc_value.with_traceback(new_tb)
+
+
+def _raise_at(filename: str, line: int, name: str) -> CodeType:
+    if not hasattr(_RAISE_CODE, "replace"):  # pragma: no cover
+        # Python<3.8 can't change the location of code objects
+        return compile("\n" * (line - 1) + _RAISE_SOURCE, filename, "exec")
+    changes: Dict[str, Any] = {
+        "co_filename": filename,
+        "co_firstlineno": line,
+        "co_name": name,
+    }
+    if hasattr(_RAISE_CODE, "co_qualname"):
+        changes["co_qualname"] = name
+    code: CodeType = _RAISE_CODE.replace(**changes)
+    return code
+
+
+_RAISE_SOURCE = "raise RuntimeError('dialect failed')"
+_RAISE_CODE = compile(_RAISE_SOURCE, "<string>", "exec")
@@ -0,0 +1,191 @@
+"""Write dialect modules out as plain Python so they can run without Pyalect.
+
+Each module with a dialect header is transpiled and its tree is turned back into source
+with :func:`ast.unparse` (so Python 3.9 or later is needed). Other modules are copied
+as they are, giving a tree of ordinary Python files which mirrors the original:
+
+.. code-block:: bash
+
+    python -m pyalect export --import my_project.dialects -o build/ my_project/
+
+Statements are kept on the lines they were on in the transpiled source, so line
+numbers in tracebacks still match the original - except after statements which shared
+a line (``if x: return`` for instance), as these are split onto several lines.
+Comments and formatting are not preserved, and only ``*.py`` files are written.
+"""
+
+import ast
+import functools
+import os
+import sys
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .cache import _write_atomic
+from .dialect import apply_dialects, find_source_dialects
+from .errors import DialectError, reraise_dialect_error
+from .importer import decode_source
+from .precompile import _failed, _pool_size, find_source_files, process_pool
+
+
+class ExportResult(NamedTuple):
+    """The outcome of exporting a single file."""
+
+    path: str
+    """The path to the source file."""
+
+    output: str
+    """The path the file was written to."""
+
+    status: str
+    """One of ``"exported"`` (it had dialects), ``"copied"``, or ``"failed"``."""
+
+    error: Optional[str] = None
+    """A description of the problem if ``status`` is ``"failed"``."""
+
+    line: Optional[int] = None
+    """The line the problem was found on, if known."""
+
+
+def export_paths(
+    paths: Iterable[Union[str, "os.PathLike[str]"]],
+    output: Union[str, "os.PathLike[str]"],
+    workers: int = 1,
+    imports: Sequence[str] = (),
+) -> Iterator[ExportResult]:
+    """Export every module in the given files and directories as plain Python.
+
+    A directory ``my_project/`` is written to ``<output>/my_project/`` and a file
+    directly into ``output``.
+
+    Parameters:
+        paths: files, or directories which are searched recursively.
+        output: the directory to write to.
+        workers: the number of processes to use (``0`` means one per CPU).
+        imports: modules to import in each worker before exporting - these should
+            register the dialects which are needed.
+
+    Yields:
+        An :class:`ExportResult` for each file, in order.
+    """
+    files: List[Tuple[str, str]] = []
+    for path in (os.fspath(p) for p in paths):
+        root = os.path.dirname(os.path.normpath(os.path.abspath(path)))
+        for source in find_source_files([path]):
+            relative = os.path.relpath(os.path.abspath(source), root)
+            files.append((source, os.path.join(os.fspath(output), relative)))
+
+    with process_pool(workers, imports) as executor:
+        yield from executor.map(
+            export_file,
+            [source for source, _ in files],
+            [destination for _, destination in files],
+            chunksize=max(1, len(files) // (8 * _pool_size(workers))),
+        )
+
+
+def export_file(path: str, output: str) -> ExportResult:
+    """Export a single file to the given path - see :func:`export_paths`."""
+    try:
+        with open(path, "rb") as f:
+            source_bytes = f.read()
+        dialects = find_source_dialects(source_bytes)
+        if dialects:
+            data = export_source(decode_source(source_bytes), dialects, path).encode()
+        else:
+            data = source_bytes
+    except Exception as error:
+        result = _failed(path, error)
+        return ExportResult(path, output, "failed", result.error, result.line)
+    if not _write_atomic(output, data):
+        return ExportResult(path, output, "failed", f"could not write {output!r}")
+    return ExportResult(path, output, "exported" if dialects else "copied")
+
+
+def export_source(
+    source: str, dialects: Union[str, Iterable[str]], filename: Optional[str] = None
+) -> str:
+    """Transpile source with the given dialects and return it as plain Python."""
+    try:
+        tree = apply_dialects(source, dialects, filename)
+    except DialectError:
+        reraise_dialect_error()
+    return unparse(tree)
+
+
+def unparse(tree: ast.AST) -> str:
+    """Like :func:`ast.unparse` but statements are placed on their original lines
+    (given by their ``lineno``) if the code before them leaves enough room."""
+    if sys.version_info < (3, 9):  # pragma: no cover
+        raise RuntimeError("Exporting requires Python 3.9 or later")
+    source: str = _line_unparser()().visit(tree)
+    return source + "\n"
+
+
+@functools.lru_cache(maxsize=None)
+def _line_unparser() -> Any:
+    try:
+        # Python 3.14 moved the unparser and only binds ast._Unparser once it's used
+        from _ast_unparse import Unparser
+    except ImportError:
+        Unparser = ast._Unparser  # type: ignore
+
+    class _LineUnparser(Unparser):  # type: ignore
+        def __init__(self, *args: Any, **kwargs: Any) -> None:
+            super().__init__(*args, **kwargs)
+            self._line = 1
+            self._skip_newline = False
+
+        def visit(self, node: ast.AST) -> str:
+            self._line = 1
+            self._skip_newline = False
+            source: str = super().visit(node)
+            return source
+
+        def maybe_newline(self) -> None:
+            if self._skip_newline:
+                self._skip_newline = False
+            else:
+                super().maybe_newline()
+
+        def write(self, *text: str) -> None:
+            super().write(*text)
+            self._line += sum(t.count("\n") for t in text)
+
+        def traverse(self, node: Union[ast.AST, List[ast.AST]]) -> None:
+            if isinstance(node, ast.stmt):
+                self._move_to(node)
+            super().traverse(node)
+
+        def _move_to(self, node: ast.stmt) -> None:
+            decorators = getattr(node, "decorator_list", None)
+            first = decorators[0] if decorators else node
+            lineno = getattr(first, "lineno", None)
+            if lineno is None:
+                return None
+            if not self._source and lineno >= 2:
+                # nothing was written yet - once something has been, even an empty
+                # string, the unparser begins the statement with a newline
+                self.write("")
+            # the unparser puts a blank line before functions and classes - leave it
+            # out if it would push them past their line
+            extra = isinstance(
+                node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+            )
+            if extra and self._line + 2 > lineno:
+                self._skip_newline = True
+                extra = False
+            padding = lineno - (self._line + 1 + extra)
+            if padding > 0:
+                self.write("\n" * padding)
+
+    return _LineUnparser
@@ -1,16 +1,44 @@
+import _imp
 import io
+import os
+import pkgutil
 import sys
 import tokenize
 import types
 from importlib.abc import MetaPathFinder
-from importlib.machinery import ModuleSpec, SourceFileLoader
-from importlib.util import spec_from_file_location
-from pathlib import Path
+from importlib.machinery import (
+    BYTECODE_SUFFIXES,
+    EXTENSION_SUFFIXES,
+    SOURCE_SUFFIXES,
+    ExtensionFileLoader,
+    FileFinder,
+    ModuleSpec,
+    SourceFileLoader,
+    SourcelessFileLoader,
+)
+from importlib.util import LazyLoader
 from types import CodeType
-from typing import Dict, List, Optional, Sequence, Union
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
+from . import instrument
+from .cache import cache_path, dump_code, load_code
 from .dialect import apply_dialects, find_file_dialects
 from .errors import DialectError, reraise_dialect_error
+from .manifest import ManifestEntry, load_manifest
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .server import Client
 
 
 def decode_source(source_bytes: bytes) -> str:
@@ -22,38 +50,179 @@ def decode_source(source_bytes: bytes) -> str:
 
 
 class PyalectLoader(SourceFileLoader):
-    """Import loader for Pyalect."""
+    """Import loader for Pyalect.
+
+    Transpiled code is cached separately from normal bytecode - see :mod:`pyalect.cache`.
+    If ``PYALECT_SERVER`` is set, code is requested from a server before transpiling
+    it in this process - see :mod:`pyalect.server`.
+    """
 
     def __init__(self, dialects: List[str], fullname: str, filename: str):
         super().__init__(fullname, filename)
         self.dialects = dialects
 
+    def get_code(self, fullname: str) -> CodeType:
+        with instrument.module(fullname):
+            source_path = self.get_filename(fullname)
+            with instrument.measure("cache_load"):
+                code = load_code(source_path, self.dialects)
+            if code is not None:
+                instrument.count("code_cache_hits")
+                # the code may have been compiled with a relative or different path
+                _imp._fix_co_filename(code, source_path)  # type: ignore
+                return code
+            instrument.count("code_cache_misses")
+            with instrument.measure("read"):
+                # stat'ed first so edits made while transpiling invalidate the cache
+                source_stat = os.stat(source_path)
+                source_bytes = self.get_data(source_path)
+            code = self.source_to_code(source_bytes, source_path)
+            if not sys.dont_write_bytecode:
+                with instrument.measure("cache_dump"):
+                    dump_code(
+                        source_path,
+                        source_bytes,
+                        self.dialects,
+                        code,
+                        source_stat=source_stat,
+                    )
+            return code
+
     def source_to_code(  # type: ignore
         self, data: Union[bytes, str], path: str = "<string>"
     ) -> CodeType:
         if isinstance(data, bytes):
-            source = decode_source(data)
+            with instrument.measure("decode"):
+                source = decode_source(data)
         else:
             source = data
         try:
+            if _SERVER_CLIENT is not None:
+                with instrument.measure("server"):
+                    served = _SERVER_CLIENT.transpile(source, self.dialects, path)
+                if served is not None:
+                    instrument.count("server_hits")
+                    return served
+                instrument.count("server_misses")
             ast_tree = apply_dialects(source, self.dialects, path)
         except DialectError:
             reraise_dialect_error()
-        code: CodeType = compile(ast_tree, path, "exec")
+        with instrument.measure("compile"):
+            code: CodeType = compile(ast_tree, path, "exec")
         return code
 
 
+class PyalectPathFinder:
+    """A path entry finder which loads modules that have dialects with a
+    :class:`PyalectLoader`.
+
+    One of these is created per directory on :data:`sys.path` (or a package's
+    ``__path__``) by a hook in :data:`sys.path_hooks` - see :func:`install`. Lookups
+    are delegated to a :class:`~importlib.machinery.FileFinder` for the same directory,
+    so directory listings are cached just like a normal import. The dialects found in
+    a source file are remembered until its modification time or size changes. If the
+    file's directory has an up to date manifest (see :mod:`pyalect.manifest`) the
+    file isn't read at all.
+    """
+
+    def __init__(self, path: str, *loader_details: Tuple[type, List[str]]) -> None:
+        self._finder = FileFinder(path, *(loader_details or _default_loader_details()))
+        self._dialects: Dict[str, Tuple[Tuple[int, int], List[str]]] = {}
+        self._manifests: Dict[str, Dict[str, ManifestEntry]] = {}
+
+    @property
+    def path(self) -> str:
+        """The directory this finder searches."""
+        path: str = self._finder.path
+        return path
+
+    @classmethod
+    def path_hook(
+        cls, *loader_details: Tuple[type, List[str]]
+    ) -> Callable[[str], "PyalectPathFinder"]:
+        """A callable for :data:`sys.path_hooks` which creates finders for directories."""
+
+        def path_hook_for_pyalect_path_finder(path: str) -> "PyalectPathFinder":
+            if not os.path.isdir(path or os.getcwd()):
+                raise ImportError("only directories are supported", path=path)
+            return cls(path, *loader_details)
+
+        return path_hook_for_pyalect_path_finder
+
+    def invalidate_caches(self) -> None:
+        self._finder.invalidate_caches()
+        self._dialects.clear()
+        self._manifests.clear()
+
+    def find_spec(
+        self, fullname: str, target: Optional[types.ModuleType] = None
+    ) -> Optional[ModuleSpec]:
+        spec: Optional[ModuleSpec] = self._finder.find_spec(fullname, target)
+        if (
+            spec is not None
+            and spec.origin is not None
+            and isinstance(spec.loader, SourceFileLoader)
+        ):
+            with instrument.measure("find", module=fullname):
+                dialects = self._find_dialects(spec.origin)
+            if dialects:
+                loader = PyalectLoader(dialects, fullname, spec.origin)
+                spec.loader = LazyLoader(loader) if is_lazy(fullname) else loader
+                spec.cached = cache_path(spec.origin)
+        return spec
+
+    def iter_modules(self, prefix: str = "") -> Iterator[Tuple[str, bool]]:
+        """Used by :func:`pkgutil.iter_modules` to list the modules in the directory."""
+        modules: Iterator[Tuple[str, bool]]
+        modules = pkgutil.iter_importer_modules(self._finder, prefix)  # type: ignore
+        return modules
+
+    def _find_dialects(self, filename: str) -> List[str]:
+        stamp = _source_stamp(filename)
+        if stamp is None:
+            return []
+        cached = self._dialects.get(filename)
+        if cached is not None and cached[0] == stamp:
+            instrument.count("header_cache_hits")
+            return cached[1]
+        instrument.count("header_cache_misses")
+        directory, name = os.path.split(filename)
+        if directory not in self._manifests:
+            self._manifests[directory] = load_manifest(directory)
+        entry = self._manifests[directory].get(name)
+        if entry is not None and (entry.mtime_ns, entry.size) == stamp:
+            instrument.count("manifest_hits")
+            dialects = entry.dialects
+        else:
+            dialects = find_file_dialects(filename)
+        self._dialects[filename] = (stamp, dialects)
+        return dialects
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.path!r})"
+
+
 class PyalectFinder(MetaPathFinder):
     """Determine whether to load modules with a :class:`PyalectLoader`.
 
-    This class is registered to :data:`sys.meta_path`.
+    Specs are remembered until the module's source file is modified.
+
+    .. note::
+
+        This finder is not installed by default - :func:`install` registers a
+        :class:`PyalectPathFinder` hook instead so that imports which don't involve
+        dialects aren't slowed down. It remains for those who want to insert it into
+        :data:`sys.meta_path` themselves.
     """
 
     def __init__(self) -> None:
-        self._specs: Dict[str, ModuleSpec] = {}
+        self._specs: Dict[str, Tuple[Optional[Tuple[int, int]], ModuleSpec]] = {}
+        self._finders: Dict[str, PyalectPathFinder] = {}
 
     def invalidate_caches(self) -> None:
         self._specs.clear()
+        for finder in self._finders.values():
+            finder.invalidate_caches()
 
     def find_spec(
         self,
@@ -62,47 +231,197 @@ class PyalectFinder(MetaPathFinder):
         target: Optional[types.ModuleType] = None,
     ) -> Optional[ModuleSpec]:
         if fullname in self._specs:
-            return self._specs[fullname]
+            stamp, cached = self._specs[fullname]
+            # the file may have gained, lost, or changed its dialect header
+            if cached.origin is not None and _source_stamp(cached.origin) == stamp:
+                instrument.count("spec_cache_hits")
+                return cached
+            del self._specs[fullname]
 
-        known_path: List[Path]
+        known_path: List[str]
         if path is None:
-            known_path = [Path.cwd()]  # top level import
-        else:
-            str_paths = (p if isinstance(p, str) else p.decode() for p in path)
-            known_path = list(map(Path, str_paths))
-
-        if "." in fullname:
-            name = fullname.rsplit(".", 1)[1]
+            known_path = sys.path  # top level import
         else:
-            name = fullname
+            known_path = [p if isinstance(p, str) else p.decode() for p in path]
 
         for entry in known_path:
-            submodule_locations: Optional[List[str]]
-            if (entry / name).is_dir():
-                filename = entry / name / "__init__.py"
-                submodule_locations = [str(entry / name)]
-            else:
-                filename = entry / (name + ".py")
-                submodule_locations = None
-
-            if not filename.exists():
+            finder = self._path_finder(entry)
+            if finder is None:
                 continue
 
-            dialects = find_file_dialects(filename)
-
-            if not dialects:
+            spec = finder.find_spec(fullname, target)
+            if spec is None:
+                continue
+            elif spec.loader is None:
+                # namespace package portion - a module may still be found later
                 continue
+            elif not isinstance(spec.loader, (PyalectLoader, LazyLoader)):
+                # found a normal module - leave it to the normal import system
+                return None
 
-            spec = self._specs[fullname] = spec_from_file_location(
-                fullname,
-                filename,
-                loader=PyalectLoader(dialects, fullname, str(filename)),
-                submodule_search_locations=submodule_locations,
-            )
+            if spec.origin is not None:
+                self._specs[fullname] = (_source_stamp(spec.origin), spec)
             return spec
 
         # we don't know how to import this
         return None
 
+    def _path_finder(self, entry: str) -> Optional[PyalectPathFinder]:
+        if entry not in self._finders:
+            if not os.path.isdir(entry or os.getcwd()):
+                return None
+            self._finders[entry] = PyalectPathFinder(entry)
+        return self._finders[entry]
+
+
+def lazy(*packages: str, enabled: bool = True) -> None:
+    """Defer transpiling and executing dialect modules until they're first used.
+
+    Dialect headers are still found at import time, but the module is only transpiled
+    and executed once one of its attributes is accessed - see
+    :class:`importlib.util.LazyLoader`. This may also be enabled by setting the
+    ``PYALECT_LAZY`` environment variable to ``1``, or to a comma separated list of
+    packages.
+
+    Parameters:
+        packages: the packages (and their submodules) to load lazily. If none are
+            given, all dialect modules are affected.
+        enabled: whether to turn lazy loading on or off.
+    """
+    global _LAZY_ALL
+    if not packages:
+        _LAZY_ALL = enabled
+        if not enabled:
+            _LAZY_PACKAGES.clear()
+    elif enabled:
+        _LAZY_PACKAGES.update(packages)
+    else:
+        _LAZY_PACKAGES.difference_update(packages)
+
+
+def is_lazy(fullname: str) -> bool:
+    """Whether the module with the given name will be loaded lazily - see :func:`lazy`"""
+    if _LAZY_ALL:
+        return True
+    name = fullname
+    while True:
+        if name in _LAZY_PACKAGES:
+            return True
+        if "." not in name:
+            return False
+        name = name.rsplit(".", 1)[0]
+
+
+def install() -> None:
+    """Install Pyalect's import hook (this is done when :mod:`pyalect` is imported).
+
+    If Pytest has been imported, its assertion rewriting hook is also made to leave
+    modules with dialects to Pyalect - call this again if Pytest is imported later.
+    """
+    if _PATH_HOOK not in sys.path_hooks:
+        sys.path_hooks.insert(0, _PATH_HOOK)
+        # finders created before the hook was installed won't know about dialects
+        _clear_path_importer_cache(FileFinder)
+    _patch_pytest_rewrite_hook()
+
+
+def uninstall() -> None:
+    """Remove Pyalect's import hook."""
+    if _PATH_HOOK in sys.path_hooks:
+        sys.path_hooks.remove(_PATH_HOOK)
+        _clear_path_importer_cache(PyalectPathFinder)
+
+
+def _clear_path_importer_cache(finder_type: type) -> None:
+    for entry, finder in list(sys.path_importer_cache.items()):
+        if isinstance(finder, finder_type):
+            del sys.path_importer_cache[entry]
+
+
+class _FoundDialectModule(Exception):
+    def __init__(self, spec: ModuleSpec) -> None:
+        super().__init__(spec)
+        self.spec = spec
+
+
+def _patch_pytest_rewrite_hook() -> None:
+    # Pytest's assertion rewriting hook sits in front of sys.meta_path and loads any
+    # test module it finds with a SourceFileLoader itself - PyalectLoader included -
+    # so its dialects would be skipped. The hook's own lookup is made to bail out with
+    # the spec of such modules instead. Importing Pytest is slow so it isn't done here.
+    rewrite = sys.modules.get("_pytest.assertion.rewrite")
+    if rewrite is None:
+        return None
+    hook = rewrite.AssertionRewritingHook
+    original = hook.find_spec
+    if getattr(original, "_pyalect_patched", False):
+        return None
+    original_find = hook._find_spec
+
+    def _find_spec(
+        name: str,
+        path: Optional[Sequence[str]] = None,
+        target: Optional[types.ModuleType] = None,
+    ) -> Optional[ModuleSpec]:
+        spec: Optional[ModuleSpec] = original_find(name, path, target)
+        if spec is not None and isinstance(spec.loader, (PyalectLoader, LazyLoader)):
+            raise _FoundDialectModule(spec)
+        return spec
+
+    def find_spec(
+        self: MetaPathFinder,
+        name: str,
+        path: Optional[Sequence[str]] = None,
+        target: Optional[types.ModuleType] = None,
+    ) -> Optional[ModuleSpec]:
+        try:
+            spec: Optional[ModuleSpec] = original(self, name, path, target)
+        except _FoundDialectModule as found:
+            return found.spec
+        return spec
+
+    find_spec._pyalect_patched = True  # type: ignore
+    hook._find_spec = staticmethod(_find_spec)
+    hook.find_spec = find_spec
+
+
+def _source_stamp(filename: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _default_loader_details() -> List[Tuple[type, List[str]]]:
+    return [
+        (ExtensionFileLoader, EXTENSION_SUFFIXES),
+        (SourceFileLoader, SOURCE_SUFFIXES),
+        (SourcelessFileLoader, BYTECODE_SUFFIXES),
+    ]
+
+
+def _lazy_from_environ(value: str) -> Tuple[bool, Set[str]]:
+    value = value.strip()
+    if value.lower() in ("", "0", "false"):
+        return False, set()
+    elif value.lower() in ("1", "true", "*"):
+        return True, set()
+    else:
+        return False, {name.strip() for name in value.split(",") if name.strip()}
+
+
+_SERVER_CLIENT: Optional["Client"] = None
+_LAZY_ALL, _LAZY_PACKAGES = _lazy_from_environ(os.environ.get("PYALECT_LAZY", ""))
+_PATH_HOOK = PyalectPathFinder.path_hook()
+install()
+
+if os.environ.get("PYALECT_BUNDLE"):
+    from .bundle import _install_from_environ
+
+    _install_from_environ(os.environ["PYALECT_BUNDLE"])
+
+if os.environ.get("PYALECT_SERVER"):
+    from .server import Client
 
-sys.meta_path.insert(0, PyalectFinder())
+    _SERVER_CLIENT = Client(os.environ["PYALECT_SERVER"])
@@ -0,0 +1,255 @@
+"""Measure where the time goes when importing dialect modules.
+
+Much like ``python -X importtime``, setting the ``PYALECT_IMPORTTIME`` environment
+variable reports on every dialect module imported by the process when it exits. Use
+``1`` to print a table to :data:`sys.stderr`, or a path ending in ``.json`` to write
+the report there instead. Measurements can also be collected programmatically:
+
+.. code-block::
+
+    from pyalect import instrument
+
+    instrument.enable()
+    import my_dialect_module
+    print(instrument.report().format_table())
+
+Time is recorded for each of the following stages, both per module and, for stages
+that run a dialect's code, per dialect:
+
+- ``find`` - searching a source file for its dialect header
+- ``cache_load`` and ``cache_dump`` - reading and writing the bytecode cache
+- ``read`` and ``decode`` - reading the source file and decoding it to text
+- ``server`` - requesting code from a server (see :mod:`pyalect.server`)
+- ``transform_src`` - a dialect's :meth:`~pyalect.dialect.Dialect.transform_src`
+- ``parse`` - parsing the transformed source into an AST
+- ``transform_ast`` - a dialect's :meth:`~pyalect.dialect.Dialect.transform_ast`
+- ``compile`` - compiling the final AST into code
+
+Visitor dialects that share a traversal (see
+:class:`~pyalect.dialect.VisitorDialect`) are reported together under their names
+joined with ``+``.
+"""
+
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+STAGES = (
+    "find",
+    "cache_load",
+    "read",
+    "decode",
+    "server",
+    "transform_src",
+    "parse",
+    "transform_ast",
+    "compile",
+    "cache_dump",
+)
+
+
+class Report(NamedTuple):
+    """Measurements collected while instrumentation was enabled."""
+
+    modules: Dict[str, Dict[str, float]]
+    """Seconds spent in each stage, by module name."""
+
+    dialects: Dict[str, Dict[str, float]]
+    """Seconds spent in each stage, by dialect name."""
+
+    counters: Dict[str, int]
+    """Cache hits and misses - ``code_cache_hits`` for instance."""
+
+    def to_json(self, **kwargs: Any) -> str:
+        """Serialize the report - keyword arguments are passed to :func:`json.dumps`."""
+        return json.dumps(self._asdict(), **kwargs)
+
+    def format_table(self) -> str:
+        """Format the report as plain text tables of milliseconds."""
+        sections = [
+            _format_rows("module", self.modules),
+            _format_rows("dialect", self.dialects),
+        ]
+        if self.counters:
+            width = max(map(len, self.counters))
+            sections.append(
+                "\n".join(
+                    f"{name:<{width}}  {value}"
+                    for name, value in sorted(self.counters.items())
+                )
+            )
+        return "\n\n".join(sections) + "\n"
+
+
+def enable(enabled: bool = True) -> None:
+    """Turn instrumentation on or off - measurements are kept until :func:`reset`."""
+    global _ENABLED
+    _ENABLED = enabled
+
+
+def is_enabled() -> bool:
+    """Whether instrumentation is currently turned on."""
+    return _ENABLED
+
+
+def reset() -> None:
+    """Discard all measurements collected so far."""
+    with _LOCK:
+        _MODULES.clear()
+        _DIALECTS.clear()
+        _COUNTERS.clear()
+
+
+def report() -> Report:
+    """A copy of the measurements collected so far."""
+    with _LOCK:
+        return Report(
+            {name: dict(stages) for name, stages in _MODULES.items()},
+            {name: dict(stages) for name, stages in _DIALECTS.items()},
+            dict(_COUNTERS),
+        )
+
+
+def module(name: str) -> "_Measurement":
+    """Attribute stages measured within this context to the named module."""
+    return _ModuleContext(name) if _ENABLED else _NULL
+
+
+def measure(
+    stage: str, dialect: Optional[str] = None, module: Optional[str] = None
+) -> "_Measurement":
+    """Time a stage of transpiling within this context.
+
+    Parameters:
+        stage: the name of the stage (see :data:`STAGES`).
+        dialect: the dialect whose code runs in this stage, if any.
+        module: the module this stage belongs to - by default the one given to the
+            closest :func:`module` context in this thread.
+    """
+    return _Timer(stage, dialect, module) if _ENABLED else _NULL
+
+
+def count(counter: str) -> None:
+    """Increment a counter by one."""
+    if _ENABLED:
+        with _LOCK:
+            _COUNTERS[counter] = _COUNTERS.get(counter, 0) + 1
+
+
+class _Measurement:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc_info: Any) -> None:
+        return None
+
+
+class _ModuleContext(_Measurement):
+    __slots__ = ("_name",)
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+
+    def __enter__(self) -> None:
+        _module_stack().append(self._name)
+
+    def __exit__(self, *exc_info: Any) -> None:
+        _module_stack().pop()
+
+
+class _Timer(_Measurement):
+    __slots__ = ("_stage", "_dialect", "_module", "_start")
+
+    def __init__(self, stage: str, dialect: Optional[str], module: Optional[str]):
+        self._stage = stage
+        self._dialect = dialect
+        self._module = module
+        self._start = 0.0
+
+    def __enter__(self) -> None:
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        elapsed = time.perf_counter() - self._start
+        module = self._module
+        if module is None:
+            stack = _module_stack()
+            module = stack[-1] if stack else None
+        with _LOCK:
+            if module is not None:
+                _add_time(_MODULES, module, self._stage, elapsed)
+            if self._dialect is not None:
+                _add_time(_DIALECTS, self._dialect, self._stage, elapsed)
+
+
+def _add_time(
+    table: Dict[str, Dict[str, float]], name: str, stage: str, elapsed: float
+) -> None:
+    stages = table.setdefault(name, {})
+    stages[stage] = stages.get(stage, 0.0) + elapsed
+
+
+def _module_stack() -> List[str]:
+    try:
+        stack: List[str] = _LOCAL.modules
+    except AttributeError:
+        stack = _LOCAL.modules = []
+    return stack
+
+
+def _format_rows(title: str, table: Dict[str, Dict[str, float]]) -> str:
+    stages = [s for s in STAGES if any(s in t for t in table.values())]
+    stages.extend(sorted({s for t in table.values() for s in t} - set(stages)))
+    header = [title] + stages + ["total"]
+    rows = [header]
+    for name, times in sorted(table.items(), key=_total_time, reverse=True):
+        cells = [f"{times[s] * 1000:.3f}" if s in times else "-" for s in stages]
+        rows.append([name] + cells + [f"{sum(times.values()) * 1000:.3f}"])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(
+            cell.ljust(width) if i == 0 else cell.rjust(width)
+            for i, (cell, width) in enumerate(zip(row, widths))
+        ).rstrip()
+        for row in rows
+    )
+
+
+def _total_time(item: Tuple[str, Dict[str, float]]) -> float:
+    return sum(item[1].values())
+
+
+def _report_at_exit(destination: str) -> None:
+    result = report()
+    if destination.endswith(".json"):
+        with open(destination, "w") as f:
+            f.write(result.to_json(indent=2))
+    else:
+        sys.stderr.write(result.format_table())
+
+
+def _from_environ(value: str) -> Optional[str]:
+    value = value.strip()
+    if value.lower() in ("", "0", "false"):
+        return None
+    return value
+
+
+_ENABLED = False
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_MODULES: Dict[str, Dict[str, float]] = {}
+_DIALECTS: Dict[str, Dict[str, float]] = {}
+_COUNTERS: Dict[str, int] = {}
+_NULL = _Measurement()
+
+_DESTINATION = _from_environ(os.environ.get("PYALECT_IMPORTTIME", ""))
+if _DESTINATION is not None:
+    enable()
+    atexit.register(_report_at_exit, _DESTINATION)
@@ -0,0 +1,123 @@
+"""Record which dialects the modules in a directory use, ahead of time.
+
+To decide how to import a module, Pyalect normally opens its source file and reads the
+dialect header. A manifest lists the dialects of every source file in a directory, along
+with the modification time and size each file had, so the header is only read when a
+file has changed since the manifest was written - useful on slow or networked file
+systems:
+
+.. code-block:: bash
+
+    python -m pyalect manifest my_project/
+
+Manifests are written to ``__pycache__`` and updated incrementally - running the command
+again only reads the files which have changed.
+"""
+
+import json
+import os
+import tokenize
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Union
+
+from .cache import _write_atomic
+from .dialect import find_file_dialects
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "pyalect-manifest.json"
+
+
+class ManifestEntry(NamedTuple):
+    """The dialects of a source file when the manifest was written."""
+
+    dialects: List[str]
+    """The dialects named in the file's header."""
+
+    mtime_ns: int
+    """The file's modification time."""
+
+    size: int
+    """The file's size in bytes."""
+
+
+def manifest_path(directory: Union[str, "os.PathLike[str]"]) -> str:
+    """The path where the manifest for the given directory is written."""
+    return os.path.join(os.fspath(directory), "__pycache__", MANIFEST_NAME)
+
+
+def load_manifest(
+    directory: Union[str, "os.PathLike[str]"],
+) -> Dict[str, ManifestEntry]:
+    """Load the manifest of a directory, keyed by file name.
+
+    An empty manifest is returned if none was written or it can't be read.
+    """
+    try:
+        with open(manifest_path(directory), "rb") as f:
+            data = json.loads(f.read())
+        if data["version"] != FORMAT_VERSION:
+            return {}
+        return {
+            name: ManifestEntry(list(dialects), int(mtime_ns), int(size))
+            for name, (dialects, mtime_ns, size) in data["files"].items()
+        }
+    except (OSError, ValueError, TypeError, KeyError):
+        return {}
+
+
+def update_manifest(directory: Union[str, "os.PathLike[str]"]) -> bool:
+    """Write the manifest for the source files in a directory (not its subdirectories).
+
+    Only files which changed since the manifest was last written are read. Files whose
+    header can't be read are left out so they're scanned at import time instead.
+
+    Returns:
+        Whether the manifest needed to be written.
+    """
+    directory = os.fspath(directory)
+    old = load_manifest(directory)
+    new: Dict[str, ManifestEntry] = {}
+    with os.scandir(directory) as it:
+        for item in it:
+            if not item.name.endswith(".py") or not item.is_file():
+                continue
+            st = item.stat()
+            entry = old.get(item.name)
+            if entry is None or (entry.mtime_ns, entry.size) != (
+                st.st_mtime_ns,
+                st.st_size,
+            ):
+                try:
+                    dialects = find_file_dialects(item.path)
+                except (OSError, SyntaxError, ValueError, tokenize.TokenError):
+                    continue
+                entry = ManifestEntry(dialects, st.st_mtime_ns, st.st_size)
+            new[item.name] = entry
+
+    if new == old and os.path.exists(manifest_path(directory)):
+        return False
+    data = {"version": FORMAT_VERSION, "files": new}
+    content = json.dumps(data, sort_keys=True).encode()
+    if not _write_atomic(manifest_path(directory), content):
+        raise OSError(f"Could not write manifest for {directory!r}")
+    return True
+
+
+def update_manifests(paths: Iterable[Union[str, "os.PathLike[str]"]]) -> List[str]:
+    """Update the manifests of the given directories and all their subdirectories.
+
+    Returns:
+        The directories whose manifests needed to be written.
+    """
+    return [d for d in _source_directories(paths) if update_manifest(d)]
+
+
+def _source_directories(
+    paths: Iterable[Union[str, "os.PathLike[str]"]],
+) -> Iterator[str]:
+    for path in (os.fspath(p) for p in paths):
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(
+                d for d in dirs if d != "__pycache__" and not d.startswith(".")
+            )
+            if any(name.endswith(".py") for name in files):
+                yield root
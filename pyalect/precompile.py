@@ -0,0 +1,279 @@
+"""Transpile dialect modules ahead of time, like :mod:`compileall`.
+
+The code is written to the same cache which :class:`~pyalect.importer.PyalectLoader`
+reads from (see :mod:`pyalect.cache`) so later imports don't need to transpile.
+
+.. code-block:: bash
+
+    python -m pyalect compile --import my_project.dialects -j 0 my_project/
+"""
+
+import os
+from concurrent.futures import Executor, Future
+from importlib import import_module
+from importlib.util import find_spec
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .cache import PycInvalidationMode, dump_code, is_cached
+from .dialect import _REGISTERED_DIALECTS, find_file_dialects
+from .errors import DialectError
+from .importer import PyalectLoader
+
+
+class CompileResult(NamedTuple):
+    """The outcome of precompiling a single file."""
+
+    path: str
+    """The path to the source file."""
+
+    status: str
+    """One of ``"compiled"``, ``"current"`` (the cache was up to date), ``"uncached"``
+    (it was transpiled but couldn't be written to the cache), ``"checked"`` (see
+    :func:`check_paths`), ``"skipped"`` (the file has no dialects), or ``"failed"``."""
+
+    error: Optional[str] = None
+    """A description of the problem if ``status`` is ``"failed"``."""
+
+    line: Optional[int] = None
+    """The line the problem was found on, if known."""
+
+
+def compile_paths(
+    paths: Iterable[Union[str, "os.PathLike[str]"]],
+    workers: int = 1,
+    force: bool = False,
+    invalidation_mode: Optional[PycInvalidationMode] = None,
+    imports: Sequence[str] = (),
+) -> Iterator[CompileResult]:
+    """Precompile every dialect module in the given files and directories.
+
+    Parameters:
+        paths: files, or directories which are searched recursively.
+        workers: the number of processes to use (``0`` means one per CPU).
+        force: compile files even if their cache is up to date.
+        invalidation_mode: how the cache should determine if it's stale.
+        imports: modules to import in each worker before compiling - these should
+            register the dialects which are needed.
+
+    Yields:
+        A :class:`CompileResult` for each file, in order.
+    """
+    files = list(find_source_files(paths))
+    with process_pool(workers, imports) as executor:
+        yield from executor.map(
+            compile_file,
+            files,
+            [force] * len(files),
+            [invalidation_mode] * len(files),
+            chunksize=max(1, len(files) // (8 * _pool_size(workers))),
+        )
+
+
+def compile_file(
+    path: str,
+    force: bool = False,
+    invalidation_mode: Optional[PycInvalidationMode] = None,
+) -> CompileResult:
+    """Precompile a single file if it has dialects - see :func:`compile_paths`."""
+    try:
+        dialects = find_file_dialects(path)
+        if not dialects:
+            return CompileResult(path, "skipped")
+        source_stat = os.stat(path)
+        with open(path, "rb") as f:
+            source_bytes = f.read()
+        if not force and is_cached(
+            path, source_bytes, dialects, invalidation_mode, source_stat
+        ):
+            return CompileResult(path, "current")
+        loader = PyalectLoader(dialects, _module_name(path), path)
+        # modules are imported with an absolute path - tracebacks should match
+        code = loader.source_to_code(source_bytes, os.path.abspath(path))
+    except Exception as error:
+        return _failed(path, error)
+    if not dump_code(
+        path, source_bytes, dialects, code, invalidation_mode, source_stat
+    ):
+        # the directory may be read-only or a dialect may not have a fingerprint
+        return CompileResult(path, "uncached")
+    return CompileResult(path, "compiled")
+
+
+def check_paths(
+    paths: Iterable[Union[str, "os.PathLike[str]"]],
+    workers: int = 1,
+    imports: Sequence[str] = (),
+) -> Iterator[CompileResult]:
+    """Transpile every dialect module without writing to the cache.
+
+    Unlike importing, a failure doesn't stop the others from being checked, so every
+    :class:`~pyalect.errors.DialectError` can be collected at once. See
+    :func:`compile_paths` for a description of the parameters.
+
+    Yields:
+        A :class:`CompileResult` for each file, in order.
+    """
+    files = list(find_source_files(paths))
+    with process_pool(workers, imports) as executor:
+        yield from executor.map(
+            check_file,
+            files,
+            chunksize=max(1, len(files) // (8 * _pool_size(workers))),
+        )
+
+
+def check_file(path: str) -> CompileResult:
+    """Transpile a single file if it has dialects - see :func:`check_paths`."""
+    try:
+        dialects = find_file_dialects(path)
+        if not dialects:
+            return CompileResult(path, "skipped")
+        with open(path, "rb") as f:
+            source_bytes = f.read()
+        loader = PyalectLoader(dialects, _module_name(path), path)
+        loader.source_to_code(source_bytes, path)
+    except Exception as error:
+        return _failed(path, error)
+    return CompileResult(path, "checked")
+
+
+def warmup(
+    packages: Iterable[str], workers: int = 0, imports: Sequence[str] = ()
+) -> List[CompileResult]:
+    """Transpile the dialect modules of some packages in parallel, then import them.
+
+    Call this before a pre-forking server starts its workers - they'll then share the
+    imported modules instead of each transpiling them. Modules which fail to transpile
+    are not imported, but those which couldn't be written to the cache are.
+
+    Parameters:
+        packages: the names of the packages to warm up.
+        workers: the number of processes to transpile with (``0`` means one per CPU).
+        imports: modules to import in each worker before compiling - these should
+            register the dialects which are needed.
+
+    Returns:
+        A :class:`CompileResult` for each file in the packages.
+    """
+    roots: List[Tuple[str, str]] = []
+    for package in packages:
+        spec = find_spec(package)
+        if spec is None:
+            raise ModuleNotFoundError(f"No module named {package!r}", name=package)
+        for location in spec.submodule_search_locations or [spec.origin or ""]:
+            roots.append((package, location))
+
+    names: Dict[str, str] = {}
+    for package, location in roots:
+        for path in find_source_files([location]):
+            names[path] = _module_name_in(package, location, path)
+
+    results = list(compile_paths(names, workers=workers, imports=imports))
+    for result in results:
+        if result.status in ("compiled", "current", "uncached"):
+            import_module(names[result.path])
+    return results
+
+
+def find_source_files(paths: Iterable[Union[str, "os.PathLike[str]"]]) -> Iterator[str]:
+    """Find Python source files, searching directories recursively."""
+    for path in (os.fspath(p) for p in paths):
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(
+                d for d in dirs if d != "__pycache__" and not d.startswith(".")
+            )
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    yield os.path.join(root, name)
+
+
+def process_pool(workers: int, imports: Sequence[str] = ()) -> Executor:
+    """Create an executor which runs work in ``workers`` processes.
+
+    Each worker imports the given modules as well as those which define any dialects
+    registered in this process. With a single worker, work is done in this process.
+    """
+    modules = list(imports) + dialect_modules()
+    if workers == 1:
+        _import_modules(modules)
+        return _InlineExecutor()
+    # imported here since it's slow to import and this module is used by warmup()
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(
+        _pool_size(workers), initializer=_import_modules, initargs=(modules,)
+    )
+
+
+def dialect_modules() -> List[str]:
+    """Modules which define the currently registered dialects."""
+    return sorted(
+        {
+            cls.__module__
+            for cls in _REGISTERED_DIALECTS.values()
+            # dialects registered by entry points are found by the workers themselves
+            if isinstance(cls, type)
+            and cls.__module__ != "__main__"
+            and "<locals>" not in cls.__qualname__
+        }
+    )
+
+
+class _InlineExecutor(Executor):
+    """Runs work in this process - avoids spawning workers for serial jobs."""
+
+    def map(self, fn, *iterables, timeout=None, chunksize=1):  # type: ignore
+        return map(fn, *iterables)
+
+    def submit(self, fn, *args, **kwargs):  # type: ignore
+        future: Future[Any] = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+
+def _failed(path: str, error: Exception) -> CompileResult:
+    line: Optional[int] = None
+    if isinstance(error, DialectError):
+        line = error.line
+    elif isinstance(error, SyntaxError):
+        line = error.lineno
+    return CompileResult(path, "failed", f"{type(error).__name__}: {error}", line)
+
+
+def _import_modules(modules: Sequence[str]) -> None:
+    for name in modules:
+        import_module(name)
+
+
+def _pool_size(workers: int) -> int:
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def _module_name(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _module_name_in(package: str, location: str, path: str) -> str:
+    if not os.path.isdir(location):
+        return package
+    parts = os.path.splitext(os.path.relpath(path, location))[0].split(os.sep)
+    if parts[-1] == "__init__":
+        parts.pop()
+    return ".".join([package, *parts])
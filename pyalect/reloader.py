@@ -0,0 +1,126 @@
+"""Reload dialect modules in place when their source changes.
+
+Useful for development servers and long running workers:
+
+.. code-block::
+
+    from pyalect.reloader import Reloader
+
+    reloader = Reloader(interval=1)
+    reloader.start()
+
+Source files are polled for changes to their modification time or size. Only the
+dialect modules which changed are transpiled again (the bytecode cache of the others
+is still valid) and each is re-executed in its existing module object with
+:func:`importlib.reload` - so references held elsewhere see the new definitions.
+"""
+
+import importlib
+import os
+import sys
+import threading
+import traceback
+import types
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .cache import cache_path
+from .importer import PyalectLoader, _source_stamp
+
+ErrorCallback = Callable[[str, BaseException], None]
+
+
+class Reloader:
+    """Watches imported dialect modules and reloads those that change.
+
+    Parameters:
+        interval: seconds between checks once :meth:`start` has been called.
+        on_error: called with the module name and exception if reloading fails. By
+            default the traceback is printed to :data:`sys.stderr`.
+    """
+
+    def __init__(
+        self, interval: float = 1.0, on_error: Optional[ErrorCallback] = None
+    ) -> None:
+        self.interval = interval
+        self._on_error = on_error or _print_error
+        self._stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.check()
+
+    def check(self) -> List[str]:
+        """Reload the dialect modules whose source changed since the last check.
+
+        Modules imported since the last check are only recorded.
+
+        Returns:
+            The names of the modules which were reloaded.
+        """
+        reloaded = []
+        modules = dialect_modules()
+        for name in list(self._stamps):
+            if name not in modules:
+                del self._stamps[name]
+        for name, module in modules.items():
+            origin: str = module.__spec__.origin  # type: ignore
+            stamp = _source_stamp(origin)
+            if name not in self._stamps:
+                self._stamps[name] = stamp
+            elif stamp != self._stamps[name]:
+                self._stamps[name] = stamp
+                # the cache only records whole seconds (or nothing at all for
+                # unchecked hashes) so it may not notice the change
+                _remove_cached_code(origin)
+                try:
+                    importlib.reload(module)
+                except Exception as error:
+                    self._on_error(name, error)
+                else:
+                    reloaded.append(name)
+        return reloaded
+
+    def start(self) -> None:
+        """Check for changes every :attr:`interval` seconds in a daemon thread."""
+        if self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="pyalect-reloader", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Stop checking for changes in the background."""
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.check()
+
+
+def dialect_modules() -> Dict[str, types.ModuleType]:
+    """The imported modules which were loaded by a :class:`PyalectLoader`."""
+    modules = {}
+    for name, module in list(sys.modules.items()):
+        spec = getattr(module, "__spec__", None)
+        if (
+            spec is not None
+            and spec.origin is not None
+            and isinstance(spec.loader, PyalectLoader)
+        ):
+            modules[name] = module
+    return modules
+
+
+def _remove_cached_code(origin: str) -> None:
+    try:
+        os.unlink(cache_path(origin))
+    except OSError:
+        pass
+
+
+def _print_error(name: str, error: BaseException) -> None:
+    print(f"Failed to reload {name!r}", file=sys.stderr)
+    traceback.print_exception(type(error), error, error.__traceback__)
@@ -0,0 +1,226 @@
+"""Share the work of transpiling between processes on the same host.
+
+A server listening on a Unix domain socket transpiles and compiles modules on behalf
+of other processes, keeping the code it produces in memory (see
+:mod:`pyalect.compiler`). Processes started with ``PYALECT_SERVER`` set to the socket's
+path ask the server for a module's code before transpiling it themselves:
+
+.. code-block:: bash
+
+    python -m pyalect serve --import my_project.dialects $XDG_RUNTIME_DIR/pyalect.sock &
+    PYALECT_SERVER=$XDG_RUNTIME_DIR/pyalect.sock gunicorn my_project.app
+
+The server is only used if it runs the same version of Python and the same dialect
+implementations (see :func:`~pyalect.cache.dialects_key`) as the client. Otherwise,
+or if it can't be reached, modules are transpiled in the client as usual. Code is
+compiled at the client's optimization level (see :option:`-O`).
+
+.. warning::
+
+    Code from the server is executed without question - put the socket in a directory
+    only you can write to. It's created with permissions for its owner only, and
+    clients ignore servers run by other users.
+"""
+
+import marshal
+import os
+import socket
+import socketserver
+import stat
+import struct
+import sys
+import threading
+import time
+from importlib.util import MAGIC_NUMBER
+from types import CodeType
+from typing import Any, List, Optional, Tuple, Union
+
+from .cache import dialects_key
+from .compiler import compile_source
+from .errors import DialectError
+
+RETRY_DELAY = 5.0
+"""Seconds to wait before trying to reach a server which wasn't available again."""
+
+TIMEOUT = 60.0
+"""Seconds to wait for a server to reply."""
+
+_SIZE = struct.Struct("<Q")
+_CREDENTIALS = struct.Struct("3i")  # the pid, uid, and gid of a peer on Linux
+
+
+class TranspileServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Transpiles modules for clients - see :func:`start_server` and :func:`serve`.
+
+    Parameters:
+        path: the path of the Unix domain socket to listen on.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path: Union[str, "os.PathLike[str]"]) -> None:
+        path = os.fspath(path)
+        _remove_stale_socket(path)
+        super().__init__(path, _RequestHandler)
+
+    def server_bind(self) -> None:
+        # create the socket with permissions for its owner only - changing them later
+        # would give others a chance to connect in between
+        umask = os.umask(0o077)
+        try:
+            super().server_bind()
+        finally:
+            os.umask(umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.server_address)  # type: ignore
+        except OSError:
+            pass
+
+
+def serve(path: Union[str, "os.PathLike[str]"]) -> None:
+    """Serve clients until interrupted - dialects should be registered beforehand."""
+    with TranspileServer(path) as server:
+        server.serve_forever()
+
+
+def start_server(path: Union[str, "os.PathLike[str]"]) -> TranspileServer:
+    """Serve clients from a daemon thread - stop it with ``shutdown()`` and then
+    ``server_close()``."""
+    server = TranspileServer(path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Client:
+    """Requests code from a :class:`TranspileServer`.
+
+    Parameters:
+        path: the path of the server's Unix domain socket.
+    """
+
+    def __init__(self, path: Union[str, "os.PathLike[str]"]) -> None:
+        self.path = os.fspath(path)
+        self._retry_at = 0.0
+
+    def transpile(
+        self, source: str, dialects: List[str], filename: str
+    ) -> Optional[CodeType]:
+        """Get code for a module from the server.
+
+        Returns ``None`` if the server can't be used, in which case the module should
+        be transpiled by the caller.
+
+        Raises:
+            DialectError: if one of the dialects failed on the server.
+        """
+        if time.monotonic() < self._retry_at:
+            return None
+        key = dialects_key(dialects)
+        if key is None:
+            return None
+        try:
+            reply = self._request(
+                (MAGIC_NUMBER, key, sys.flags.optimize, source, dialects, filename)
+            )
+        except (OSError, EOFError, ValueError, TypeError):
+            self._retry_at = time.monotonic() + RETRY_DELAY
+            return None
+        if reply[0] == "code":
+            code: CodeType = reply[1]
+            return code
+        elif reply[0] == "error":
+            raise DialectError(reply[1], reply[2], reply[3])
+        return None
+
+    def _request(self, request: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(TIMEOUT)
+            sock.connect(self.path)
+            _check_server_owner(sock, self.path)
+            _send(sock, request)
+            reply: Tuple[Any, ...] = _receive(sock)
+            return reply
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.path!r})"
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        try:
+            request = _receive(self.request)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        _send(self.request, _reply(request))
+
+
+def _reply(request: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    if not isinstance(request, tuple) or len(request) != 6:
+        return ("unavailable",)
+    magic, key, optimize, source, dialects, filename = request
+    # the client must be able to run the code and expect the same transformations
+    if magic != MAGIC_NUMBER:
+        return ("unavailable",)
+    try:
+        if dialects_key(dialects) != key:
+            return ("unavailable",)
+        # compiled the way the client would have - with or without asserts etc.
+        code = compile_source(source, dialects, filename, optimize=optimize)
+        return ("code", code)
+    except DialectError as error:
+        return ("error", str(error), error.filename, error.line)
+    except Exception:
+        # let the client raise the error itself
+        return ("unavailable",)
+
+
+def _send(sock: socket.socket, message: Tuple[Any, ...]) -> None:
+    data = marshal.dumps(message)
+    sock.sendall(_SIZE.pack(len(data)) + data)
+
+
+def _receive(sock: socket.socket) -> Any:
+    (size,) = _SIZE.unpack(_receive_exactly(sock, _SIZE.size))
+    return marshal.loads(_receive_exactly(sock, size))
+
+
+def _receive_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise EOFError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _check_server_owner(sock: socket.socket, path: str) -> None:
+    # anyone who can create the socket first could run code in the client
+    if sys.platform == "linux":
+        credentials = sock.getsockopt(
+            socket.SOL_SOCKET, socket.SO_PEERCRED, _CREDENTIALS.size
+        )
+        uid = _CREDENTIALS.unpack(credentials)[1]
+    else:  # pragma: no cover
+        uid = os.stat(path).st_uid
+    if uid != os.getuid():
+        raise OSError(f"The server on {path!r} is run by another user")
+
+
+def _remove_stale_socket(path: str) -> None:
+    try:
+        if not stat.S_ISSOCK(os.stat(path).st_mode):
+            return None
+    except OSError:
+        return None
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(path)
+        except OSError:
+            os.unlink(path)
+        else:
+            raise OSError(f"A server is already listening on {path!r}")
@@ -1,17 +1,83 @@
 import ast
+import copy
+import hashlib
 import sys
+import uuid
+from collections import OrderedDict
 from traceback import print_exc
-from typing import Any, List, Optional, Type
+from typing import Any, Dict, NamedTuple, Optional, Tuple, Type
 
+from .cache import dialects_key
 from .dialect import DialectReducer, dialect_reducer
 
+# the number of transpiled cells to remember
+_CELL_CACHE_SIZE = 128
+
+
+class _PendingCell(NamedTuple):
+    reducer: Optional[DialectReducer]
+    cache_key: Optional[bytes]
+    source: str
+    tree: Optional[ast.AST]
+
+
+# cells being run by the magic, by the ID given to them in their marker
+_pending_cells: Dict[str, _PendingCell] = {}
+# the transformed source and AST of cells, by their content and dialects
+_cell_cache: "OrderedDict[bytes, Tuple[str, ast.AST]]" = OrderedDict()
+
+
+def _prepare_cell(cell_dialect: str, raw_cell: str) -> _PendingCell:
+    key = dialects_key(cell_dialect)
+    if key is not None:
+        key = hashlib.blake2b(key + raw_cell.encode("utf-8", "surrogatepass")).digest()
+        if key in _cell_cache:
+            _cell_cache.move_to_end(key)
+            source, tree = _cell_cache[key]
+            return _PendingCell(None, key, source, tree)
+    # only create the dialects (and set them up) if the cell must be transformed
+    reducer = dialect_reducer(cell_dialect)
+    return _PendingCell(reducer, key, reducer.transform_src(raw_cell), None)
+
+
+def _transform_cell_ast(pending: _PendingCell, node: ast.AST) -> ast.AST:
+    if pending.tree is not None:
+        # later transformers or the cell itself might modify the tree
+        return copy.deepcopy(pending.tree)
+    assert pending.reducer is not None
+    node = pending.reducer.transform_ast(node)
+    if pending.cache_key is not None:
+        _cell_cache[pending.cache_key] = (pending.source, copy.deepcopy(node))
+        if len(_cell_cache) > _CELL_CACHE_SIZE:
+            _cell_cache.popitem(last=False)
+    return node
+
+
+def _marked_cell_id(node: ast.Module) -> Optional[str]:
+    if not node.body:
+        return None
+    first_node = node.body[0]
+    if (
+        isinstance(first_node, ast.Assign)
+        and isinstance(first_node.targets[0], ast.Name)
+        and first_node.targets[0].id == "_DIALECT_"
+    ):
+        value = first_node.value
+        if isinstance(value, ast.Constant):
+            cell_id = value.value
+        else:  # pragma: no cover
+            cell_id = getattr(value, "s", None)  # Python<3.8 parses strings as ast.Str
+        if isinstance(cell_id, str):
+            return cell_id
+    return None
+
+
 try:
     from IPython.core.interactiveshell import InteractiveShell
     from IPython.core.magic import magics_class, Magics, cell_magic
 except ImportError:
     pass
 else:
-    _dialect_reducer_fifo_queue: List[DialectReducer] = []
 
     class DialectNodeTransformer(ast.NodeTransformer):
         """Node transformer defined to hook into IPython."""
@@ -19,15 +85,12 @@ else:
         def visit(self, node: ast.AST) -> ast.AST:
             try:
                 if isinstance(node, ast.Module):
-                    first_node = next(ast.iter_child_nodes(node))
-                    if (
-                        isinstance(first_node, ast.Assign)
-                        and isinstance(first_node.targets[0], ast.Name)
-                        and first_node.targets[0].id == "_DIALECT_"
-                        and isinstance(first_node.value, ast.Str)
-                    ):
+                    cell_id = _marked_cell_id(node)
+                    if cell_id is not None:
                         node.body.pop(0)
-                        node = _dialect_reducer_fifo_queue.pop(0).transform_ast(node)
+                        pending = _pending_cells.pop(cell_id, None)
+                        if pending is not None:
+                            node = _transform_cell_ast(pending, node)
                     return node
             except Exception:
                 print_exc(file=sys.stderr)
@@ -51,15 +114,19 @@ else:
 
             @cell_magic  # type: ignore
             def dialect(self, cell_dialect: str, raw_cell: str) -> None:
-                reducer = dialect_reducer(cell_dialect)
-                _dialect_reducer_fifo_queue.append(reducer)
-
-                self.shell.run_cell(
-                    # We need to prepend this since we can't look for
-                    # the dialect comment when transforming the AST.
-                    f"_DIALECT_ = {cell_dialect!r}\n"
-                    + reducer.transform_src(raw_cell)
-                )
+                pending = _prepare_cell(cell_dialect, raw_cell)
+                cell_id = uuid.uuid4().hex
+                _pending_cells[cell_id] = pending
+                try:
+                    self.shell.run_cell(
+                        # We need to prepend this since we can't look for
+                        # the dialect comment when transforming the AST.
+                        f"_DIALECT_ = {cell_id!r}\n"
+                        + pending.source
+                    )
+                finally:
+                    # the cell may have failed before its AST was transformed
+                    _pending_cells.pop(cell_id, None)
 
         shell_inst.register_magics(DialectMagics)
 
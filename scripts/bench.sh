@@ -0,0 +1,11 @@
+#!/bin/bash
+# Run the benchmarks, saving results under .benchmarks/ (named after the current
+# commit) and comparing them against the last saved run. Extra arguments are passed
+# to pytest, e.g. "scripts/bench.sh -k finder".
+set -e
+
+args=(benchmarks --no-cov --benchmark-autosave --benchmark-sort=name)
+if compgen -G ".benchmarks/*/*.json" > /dev/null; then
+    args+=(--benchmark-compare --benchmark-compare-fail=median:15%)
+fi
+pytest "${args[@]}" "$@"
@@ -30,6 +30,9 @@ package = {
     "platforms": "Linux, Mac OS X, Windows",
     "keywords": [],
     "include_package_data": True,
+    "entry_points": {
+        "pyalect.dialects": ["pytest = pyalect.builtins.pytest:RewritePytestAssertions"]
+    },
 }
 
 
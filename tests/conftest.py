@@ -1,7 +1,12 @@
+import sys
+import threading
+from typing import NamedTuple, Optional
+
 import pytest
 from IPython import get_ipython, start_ipython
 from IPython.terminal.interactiveshell import TerminalInteractiveShell
 
+from pyalect import Dialect, DialectError
 from pyalect.dialect import _REGISTERED_DIALECTS
 
 
@@ -16,3 +21,60 @@ def ipython():
     TerminalInteractiveShell.interact = lambda *a, **kw: None
     start_ipython([])
     return get_ipython()
+
+
+class DialectCall(NamedTuple):
+    filename: Optional[str]
+    source: str
+    thread: threading.Thread
+
+
+@pytest.fixture
+def x_to_y_dialect():
+    """Register a dialect named "test" which replaces ``x`` with ``y``.
+
+    Sources containing ``fail`` raise a :class:`DialectError` on line 2. Returns a
+    list of the calls made to the dialect.
+    """
+    calls = []
+
+    class XToY(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            calls.append(DialectCall(self.filename, source, threading.current_thread()))
+            if "fail" in source:
+                raise DialectError("failed here", self.filename, 2)
+            return source.replace("x", "y")
+
+    return calls
+
+
+@pytest.fixture
+def make_package(tmp_path, monkeypatch):
+    """Write the files of a package to a directory which is put on sys.path.
+
+    The package's modules are removed from sys.modules before and after the test.
+    """
+    names = []
+
+    def make(name, files, parent=tmp_path):
+        root = parent / name
+        root.mkdir(parents=True)
+        for path, source in files.items():
+            (root / path).parent.mkdir(parents=True, exist_ok=True)
+            (root / path).write_text(source)
+        monkeypatch.syspath_prepend(str(parent))
+        names.append(name)
+        _remove_modules(name)
+        return root
+
+    yield make
+    for name in names:
+        _remove_modules(name)
+
+
+def _remove_modules(package):
+    for name in list(sys.modules):
+        if name == package or name.startswith(package + "."):
+            del sys.modules[name]
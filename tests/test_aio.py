@@ -0,0 +1,85 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+
+import pyalect
+from pyalect import import_module_async
+
+
+@pytest.fixture
+def package(make_package):
+    return make_package(
+        "async_package",
+        {
+            "__init__.py": "",
+            "module.py": (
+                "# dialect=test\n"
+                "import threading\n"
+                "thread = threading.current_thread()\n"
+                "x = 1\n"
+            ),
+            "plain.py": "x = 1\n",
+            "broken.py": "# dialect=test\nraise ValueError()\n",
+        },
+    )
+
+
+def test_import_module_async(package, x_to_y_dialect):
+    assert pyalect.import_module_async is import_module_async
+    module = asyncio.run(import_module_async("async_package.module"))
+    assert module is sys.modules["async_package.module"]
+    assert sys.modules["async_package"].module is module
+    assert module.y == 1
+    # transpiled in the executor, executed on the loop
+    assert [c.thread for c in x_to_y_dialect] != [threading.main_thread()]
+    assert module.thread is threading.main_thread()
+
+
+def test_concurrent_imports_are_shared(package, x_to_y_dialect):
+    async def main():
+        return await asyncio.gather(
+            *[import_module_async("async_package.module") for _ in range(3)]
+        )
+
+    modules = asyncio.run(main())
+    assert modules[0] is modules[1] is modules[2]
+    assert len(x_to_y_dialect) == 1
+
+
+def test_cancelled_waiter_does_not_cancel_import(package, x_to_y_dialect):
+    async def main():
+        first = asyncio.ensure_future(import_module_async("async_package.module"))
+        second = asyncio.ensure_future(import_module_async("async_package.module"))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()).y == 1
+
+
+def test_relative_import(package, x_to_y_dialect):
+    module = asyncio.run(import_module_async(".module", "async_package"))
+    assert module.__name__ == "async_package.module"
+    assert asyncio.run(import_module_async(".module", "async_package")) is module
+
+    with pytest.raises(TypeError, match="'package' argument is required"):
+        asyncio.run(import_module_async(".module"))
+
+
+def test_modules_without_dialects_are_imported_normally(package, x_to_y_dialect):
+    assert asyncio.run(import_module_async("async_package.plain")).x == 1
+    assert x_to_y_dialect == []
+
+
+def test_module_not_found(package):
+    with pytest.raises(ModuleNotFoundError, match="async_package.missing"):
+        asyncio.run(import_module_async("async_package.missing"))
+
+
+def test_failed_module_is_removed(package, x_to_y_dialect):
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            asyncio.run(import_module_async("async_package.broken"))
+        assert "async_package.broken" not in sys.modules
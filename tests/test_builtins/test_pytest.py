@@ -1,6 +1,13 @@
 import ast
+import os
+import sys
 
-from pyalect.dialect import apply_dialects
+import pytest
+
+from pyalect import instrument
+from pyalect.cache import cache_path, load_code
+from pyalect.dialect import _REGISTERED_DIALECTS, apply_dialects, dialect_fingerprint
+from pyalect.importer import PyalectLoader
 
 
 def test_pytest_transpiler():
@@ -11,3 +18,54 @@ def test_pytest_transpiler():
     # Hard to assert exactly what the difference will be if Pytest
     # updates. Main thing is to test that it's being modified.
     assert ast.dump(ast.parse(source)) != ast.dump(tree)
+
+
+def test_pytest_transpiler_finds_config(pytestconfig):
+    from pyalect.builtins.pytest import RewritePytestAssertions
+
+    RewritePytestAssertions.setup()
+    assert RewritePytestAssertions.config is pytestconfig
+
+
+def test_pytest_dialect_is_cached(tmp_path, monkeypatch):
+    from pyalect.builtins.pytest import RewritePytestAssertions
+
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    monkeypatch.setitem(_REGISTERED_DIALECTS, "pytest", RewritePytestAssertions)
+    assert f"pytest{pytest.__version__}" in dialect_fingerprint("pytest")
+
+    path = tmp_path / "test_module.py"
+    path.write_text("# dialect=pytest\ndef test():\n    assert [1] == [2]\n")
+    loader = PyalectLoader(["pytest"], "test_module", str(path))
+    code = loader.get_code("test_module")
+    assert load_code(str(path), "pytest") == code
+
+    namespace = {}
+    exec(code, namespace)
+    with pytest.raises(AssertionError, match=r"assert \[1\] == \[2\]"):
+        namespace["test"]()
+
+
+def test_pytest_dialect_caches_test_modules(pytester, monkeypatch):
+    from pyalect.builtins.pytest import RewritePytestAssertions
+
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    monkeypatch.setitem(_REGISTERED_DIALECTS, "pytest", RewritePytestAssertions)
+    path = pytester.makepyfile(
+        test_cached="# dialect=pytest\ndef test_rewritten():\n    assert [1] == [2]\n"
+    )
+
+    instrument.reset()
+    instrument.enable()
+    try:
+        for misses, hits in [(1, 0), (1, 1)]:
+            result = pytester.runpytest("-p", "no:cacheprovider")
+            result.assert_outcomes(failed=1)
+            result.stdout.fnmatch_lines(["*assert [[]1[]] == [[]2[]]*"])
+            assert os.path.exists(cache_path(str(path)))
+            counters = instrument.report().counters
+            assert counters.get("code_cache_misses", 0) == misses
+            assert counters.get("code_cache_hits", 0) == hits
+    finally:
+        instrument.enable(False)
+        instrument.reset()
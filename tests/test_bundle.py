@@ -0,0 +1,172 @@
+import importlib
+import sys
+
+import pytest
+
+import pyalect
+from pyalect.bundle import (
+    BundleFinder,
+    BundleLoader,
+    _install_from_environ,
+    build_bundle,
+    install,
+    module_name,
+    uninstall,
+)
+from pyalect.cli import main
+
+
+@pytest.fixture
+def package(make_package):
+    return make_package(
+        "bundled",
+        {
+            "__init__.py": "# dialect=test\nx = 1\n",
+            "sub/__init__.py": "",
+            "sub/module.py": "# dialect=test\nx = 2\n",
+            "plain.py": "x = 3\n",
+        },
+    )
+
+
+@pytest.fixture
+def bundle_finder():
+    finders = []
+
+    def install_bundle(path):
+        finder = install(path)
+        finders.append(finder)
+        return finder
+
+    yield install_bundle
+    for finder in finders:
+        uninstall(finder)
+        finder.close()
+
+
+def test_module_name(package):
+    assert module_name(str(package / "__init__.py")) == ("bundled", True)
+    assert module_name(str(package / "sub" / "module.py")) == (
+        "bundled.sub.module",
+        False,
+    )
+
+
+def test_import_from_bundle(package, tmp_path, x_to_y_dialect, bundle_finder):
+    output = tmp_path / "out.pyalect"
+    results = build_bundle(output, [package])
+    assert {r.path[len(str(package)) :]: r.status for r in results} == {
+        "/__init__.py": "bundled",
+        "/plain.py": "skipped",
+        "/sub/__init__.py": "skipped",
+        "/sub/module.py": "bundled",
+    }
+
+    finder = bundle_finder(output)
+    assert set(finder.modules()) == {"bundled", "bundled.sub.module"}
+
+    # the dialect isn't needed to import bundled modules
+    pyalect.deregister("test")
+    module = importlib.import_module("bundled.sub.module")
+    assert isinstance(module.__spec__.loader, BundleLoader)
+    assert module.__spec__.loader.dialects == ["test"]
+    assert module.__file__ == str(package / "sub" / "module.py")
+    assert module.y == 2
+
+    package_module = sys.modules["bundled"]
+    assert package_module.__path__ == [str(package)]
+    assert package_module.y == 1
+
+    # modules which aren't bundled are imported normally
+    plain = importlib.import_module("bundled.plain")
+    assert not isinstance(plain.__spec__.loader, BundleLoader)
+
+
+def test_bundled_code_has_absolute_filename(
+    package, tmp_path, x_to_y_dialect, bundle_finder, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    build_bundle("out.pyalect", ["bundled"])
+    finder = bundle_finder(tmp_path / "out.pyalect")
+    code = finder.get_code(finder.modules()["bundled.sub.module"])
+    assert code.co_filename == str(package / "sub" / "module.py")
+
+
+def test_bundle_all_modules(package, tmp_path, x_to_y_dialect):
+    output = tmp_path / "out.pyalect"
+    build_bundle(output, [package], all_modules=True)
+    finder = BundleFinder(output)
+    try:
+        assert set(finder.modules()) == {
+            "bundled",
+            "bundled.sub",
+            "bundled.sub.module",
+            "bundled.plain",
+        }
+        loader = finder.find_spec("bundled.plain", None).loader
+        assert loader.get_source("bundled.plain") == "x = 3\n"
+        assert loader.get_filename("bundled.plain").endswith("plain.py")
+        assert not loader.is_package("bundled.plain")
+        assert finder.find_spec("not_bundled", None) is None
+    finally:
+        finder.close()
+
+
+def test_bundle_not_written_after_failure(package, tmp_path, x_to_y_dialect):
+    (package / "broken.py").write_text("# dialect=test\nx = (\n")
+    output = tmp_path / "out.pyalect"
+    results = build_bundle(output, [package])
+    assert [r.status for r in results if r.path.endswith("broken.py")] == ["failed"]
+    assert not output.exists()
+
+
+def test_bad_bundles(tmp_path, package, x_to_y_dialect):
+    not_a_bundle = tmp_path / "not_a_bundle"
+    not_a_bundle.write_bytes(b"\0" * 32)
+    with pytest.raises(ValueError, match="is not a bundle"):
+        BundleFinder(not_a_bundle)
+
+    output = tmp_path / "out.pyalect"
+    build_bundle(output, [package])
+    data = bytearray(output.read_bytes())
+    data[8:12] = b"\0\0\0\0"
+    output.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="another version of Python"):
+        BundleFinder(output)
+
+    with pytest.warns(UserWarning, match="Could not use bundle"):
+        _install_from_environ(str(output))
+
+
+@pytest.mark.parametrize("size", [1, 23, -1])
+def test_truncated_bundles(tmp_path, package, x_to_y_dialect, size):
+    output = tmp_path / "out.pyalect"
+    build_bundle(output, [package])
+    output.write_bytes(output.read_bytes()[:size])
+    with pytest.raises(ValueError, match="is not a bundle"):
+        BundleFinder(output)
+    with pytest.warns(UserWarning, match="Could not use bundle"):
+        _install_from_environ(str(output))
+
+
+def test_install_from_environ(package, tmp_path, x_to_y_dialect, monkeypatch):
+    output = tmp_path / "out.pyalect"
+    build_bundle(output, [package])
+    _install_from_environ(str(output))
+    try:
+        assert isinstance(sys.meta_path[0], BundleFinder)
+        assert sys.meta_path[0].path == str(output)
+    finally:
+        finder = sys.meta_path[0]
+        uninstall(finder)
+        finder.close()
+
+
+def test_bundle_command(package, tmp_path, x_to_y_dialect, capsys):
+    output = tmp_path / "out.pyalect"
+    assert main(["bundle", "-a", "-o", str(output), str(package)]) == 0
+    assert "Bundled 4 modules" in capsys.readouterr().out
+
+    (package / "broken.py").write_text("# dialect=test\nx = (\n")
+    assert main(["bundle", "-o", str(output), str(package)]) == 1
+    assert "Failed to compile" in capsys.readouterr().err
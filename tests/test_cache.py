@@ -0,0 +1,262 @@
+import multiprocessing
+import os
+import sys
+from py_compile import PycInvalidationMode
+
+import pytest
+
+from pyalect import Dialect
+from pyalect.cache import (
+    cache_path,
+    default_invalidation_mode,
+    dialects_key,
+    dump_code,
+    load_code,
+)
+from pyalect.dialect import _DIALECT_FINGERPRINTS, dialect_fingerprint
+from pyalect.importer import PyalectLoader
+
+
+@pytest.fixture
+def module_file(tmp_path):
+    path = tmp_path / "module.py"
+    path.write_text("# dialect=test\nx = 1\n")
+    return path
+
+
+def make_code(path):
+    return compile(path.read_text(), str(path), "exec")
+
+
+def test_dialect_fingerprint_uses_version():
+    class MyDialect(Dialect):
+        name = "test"
+        version = "1.0"
+
+    assert dialect_fingerprint("test").endswith("MyDialect:1.0")
+
+
+def test_dialect_fingerprint_from_source_file():
+    class MyDialect(Dialect):
+        name = "test"
+
+    fingerprint = dialect_fingerprint("test")
+    assert fingerprint is not None
+    assert fingerprint != f"{MyDialect.__module__}.{MyDialect.__qualname__}:None"
+
+
+def test_dialect_fingerprint_unknown_dialect():
+    with pytest.raises(ValueError, match="Unknown dialect"):
+        dialect_fingerprint("test")
+
+
+def test_dialects_key_depends_on_order_and_version():
+    class MyDialect1(Dialect):
+        name = "test1"
+        version = "1"
+
+    class MyDialect2(Dialect):
+        name = "test2"
+        version = "1"
+
+    key = dialects_key("test1, test2")
+    assert key == dialects_key(["test1", "test2"])
+    assert key != dialects_key("test2, test1")
+
+
+@pytest.mark.parametrize("mode", list(PycInvalidationMode))
+def test_cache_round_trip(module_file, mode):
+    class MyDialect(Dialect):
+        name = "test"
+
+    code = make_code(module_file)
+    assert dump_code(str(module_file), module_file.read_bytes(), "test", code, mode)
+    assert os.path.exists(cache_path(str(module_file)))
+    assert load_code(str(module_file), "test") == code
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="requires fork"
+)
+def test_concurrent_cache_writes(module_file):
+    class MyDialect(Dialect):
+        name = "test"
+        version = "1"
+
+    def write():
+        for _ in range(20):
+            code = make_code(module_file)
+            if not dump_code(str(module_file), module_file.read_bytes(), "test", code):
+                os._exit(1)
+        os._exit(0)
+
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=write) for _ in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert [w.exitcode for w in workers] == [0] * len(workers)
+    assert load_code(str(module_file), "test") == make_code(module_file)
+    assert os.listdir(os.path.dirname(cache_path(str(module_file)))) == [
+        os.path.basename(cache_path(str(module_file)))
+    ]
+
+
+def test_cache_invalid_after_dialect_changes(module_file):
+    class MyDialect(Dialect):
+        name = "test"
+        version = "1"
+
+    code = make_code(module_file)
+    dump_code(str(module_file), module_file.read_bytes(), "test", code)
+
+    MyDialect.version = "2"
+    del _DIALECT_FINGERPRINTS[MyDialect]
+    assert load_code(str(module_file), "test") is None
+
+
+@pytest.mark.parametrize(
+    "mode", [PycInvalidationMode.TIMESTAMP, PycInvalidationMode.CHECKED_HASH]
+)
+def test_cache_invalid_after_source_changes(module_file, mode):
+    class MyDialect(Dialect):
+        name = "test"
+
+    code = make_code(module_file)
+    dump_code(str(module_file), module_file.read_bytes(), "test", code, mode)
+
+    module_file.write_text("# dialect=test\nx = 2  # changed\n")
+    assert load_code(str(module_file), "test") is None
+
+
+def test_unchecked_hash_cache_ignores_source(module_file):
+    class MyDialect(Dialect):
+        name = "test"
+
+    code = make_code(module_file)
+    mode = PycInvalidationMode.UNCHECKED_HASH
+    dump_code(str(module_file), module_file.read_bytes(), "test", code, mode)
+
+    module_file.unlink()
+    assert load_code(str(module_file), "test") == code
+
+
+def test_corrupt_cache_is_ignored(module_file):
+    class MyDialect(Dialect):
+        name = "test"
+
+    path = cache_path(str(module_file))
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(b"garbage")
+    assert load_code(str(module_file), "test") is None
+
+
+def test_no_cache_without_fingerprint(module_file):
+    namespace = {"Dialect": Dialect}
+    exec("class MyDialect(Dialect):\n    name = 'test'", namespace)
+
+    code = make_code(module_file)
+    assert not dump_code(str(module_file), module_file.read_bytes(), "test", code)
+    assert load_code(str(module_file), "test") is None
+
+
+def test_default_invalidation_mode(monkeypatch):
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    assert default_invalidation_mode() == PycInvalidationMode.TIMESTAMP
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "0")
+    assert default_invalidation_mode() == PycInvalidationMode.CHECKED_HASH
+
+
+def test_loader_uses_cache(module_file, monkeypatch):
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    calls = []
+
+    class MyDialect(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            calls.append(source)
+            return source
+
+    loader = PyalectLoader(["test"], "module", str(module_file))
+    first = loader.get_code("module")
+    second = loader.get_code("module")
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_loader_cache_invalid_after_source_changes_while_transpiling(
+    module_file, monkeypatch
+):
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+
+    class MyDialect(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            module_file.write_text("# dialect=test\nx = 2  # edited\n")
+            return source
+
+    PyalectLoader(["test"], "module", str(module_file)).get_code("module")
+    assert load_code(str(module_file), "test") is None
+
+
+def test_loader_fixes_filename_of_cached_code(module_file):
+    class MyDialect(Dialect):
+        name = "test"
+
+    source = module_file.read_bytes()
+    code = compile("def f(): pass\n", "relative/module.py", "exec")
+    dump_code(str(module_file), source, "test", code)
+
+    loaded = PyalectLoader(["test"], "module", str(module_file)).get_code("module")
+    assert loaded.co_filename == str(module_file)
+    assert loaded.co_consts[0].co_filename == str(module_file)
+
+
+def test_loader_respects_dont_write_bytecode(module_file, monkeypatch):
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+
+    class MyDialect(Dialect):
+        name = "test"
+
+    PyalectLoader(["test"], "module", str(module_file)).get_code("module")
+    assert not os.path.exists(cache_path(str(module_file)))
+
+
+@pytest.mark.parametrize(
+    "corrupt",
+    [
+        lambda data: data[:4] + (0b100).to_bytes(4, "little") + data[8:],
+        lambda data: data[:-1],
+    ],
+)
+def test_bad_cache_data_is_ignored(module_file, corrupt):
+    class MyDialect(Dialect):
+        name = "test"
+
+    code = make_code(module_file)
+    dump_code(str(module_file), module_file.read_bytes(), "test", code)
+    path = cache_path(str(module_file))
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(corrupt(data))
+    assert load_code(str(module_file), "test") is None
+
+
+@pytest.mark.parametrize(
+    "mode", [PycInvalidationMode.TIMESTAMP, PycInvalidationMode.CHECKED_HASH]
+)
+def test_cache_invalid_after_source_removed(module_file, mode):
+    class MyDialect(Dialect):
+        name = "test"
+
+    code = make_code(module_file)
+    dump_code(str(module_file), module_file.read_bytes(), "test", code, mode)
+
+    module_file.unlink()
+    assert load_code(str(module_file), "test") is None
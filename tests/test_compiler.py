@@ -0,0 +1,163 @@
+import marshal
+import pickle
+import threading
+import traceback
+
+import pytest
+
+import pyalect
+from pyalect import Dialect, DialectError
+from pyalect.compiler import (
+    DEFAULT_CACHE_SIZE,
+    BatchResult,
+    apply_dialects_many,
+    CacheInfo,
+    cache_clear,
+    cache_info,
+    compile_source,
+    exec_source,
+    set_cache_size,
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    cache_clear()
+    yield
+    set_cache_size(DEFAULT_CACHE_SIZE)
+    cache_clear()
+
+
+def test_exec_source(x_to_y_dialect):
+    assert pyalect.exec_source is exec_source
+    namespace = exec_source("y = 1\nz = x + 1", "test", {"y": 0})
+    assert namespace["z"] == 2
+
+
+def test_compile_source_is_cached(x_to_y_dialect):
+    first = compile_source(b"x = 1", "test", "<first>")
+    assert compile_source(b"x = 1", ["test"], "<first>") is first
+    assert compile_source("x = 1", "test", "<second>") is not first
+    assert [c.filename for c in x_to_y_dialect] == ["<first>", "<second>"]
+    assert first.co_filename == "<first>"
+    assert cache_info() == CacheInfo(1, 2, 0, DEFAULT_CACHE_SIZE, 2)
+
+
+def test_compile_source_is_cached_per_optimization_level(x_to_y_dialect):
+    code = compile_source("assert x", "test", optimize=0)
+    assert code.co_names == ("y",)
+    optimized = compile_source("assert x", "test", optimize=1)
+    assert optimized.co_names == ()
+    assert compile_source("assert x", "test", optimize=0) is code
+    assert compile_source("assert x", "test") is code
+
+
+def test_compile_source_without_cache(x_to_y_dialect):
+    compile_source("x = 1", "test", cache=False)
+    compile_source("x = 1", "test", cache=False)
+    assert len(x_to_y_dialect) == 2
+    assert cache_info().currsize == 0
+
+
+def test_cache_is_keyed_on_dialect_class(x_to_y_dialect):
+    first = compile_source("x = 1", "test")
+    pyalect.deregister("test")
+
+    class Replacement(Dialect):
+        name = "test"
+
+    assert compile_source("x = 1", "test") is not first
+
+
+def test_cache_evicts_least_recently_used(x_to_y_dialect):
+    set_cache_size(2)
+    first = compile_source("x = 1", "test")
+    compile_source("x = 2", "test")
+    assert compile_source("x = 1", "test") is first
+    compile_source("x = 3", "test")
+    assert compile_source("x = 1", "test") is first
+    assert cache_info() == CacheInfo(2, 3, 1, 2, 2)
+
+    set_cache_size(0)
+    compile_source("x = 1", "test")
+    assert cache_info() == CacheInfo(2, 4, 3, 0, 0)
+
+    with pytest.raises(ValueError, match="at least 0"):
+        set_cache_size(-1)
+
+
+def test_compile_source_reraises_dialect_errors():
+    class Broken(Dialect, name="broken"):
+        def transform_src(self, source):
+            raise DialectError("bad source", self.filename, 2)
+
+    with pytest.raises(DialectError) as info:
+        compile_source("x = 1\nx = 2\n", "broken", "<broken>")
+    frame = traceback.extract_tb(info.value.__traceback__)[-1]
+    assert (frame.filename, frame.lineno) == ("<broken>", 2)
+    assert cache_info().currsize == 0
+
+
+def test_compile_source_from_many_threads(x_to_y_dialect):
+    codes = []
+
+    def compile_many():
+        for i in range(50):
+            codes.append(compile_source(f"x = {i % 10}", "test"))
+
+    threads = [threading.Thread(target=compile_many) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    info = cache_info()
+    assert info.hits + info.misses == 200
+    assert info.currsize == 10
+    assert len(set(map(id, codes))) >= 10
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_apply_dialects_many(x_to_y_dialect, workers):
+    items = [
+        ("x = 1", "test", "good.py"),
+        (b"\nfail", ["test"], "failing.py"),
+        ("x = (", "test", None),
+    ]
+    results = sorted(apply_dialects_many(iter(items), workers=workers))
+    assert [r.position for r in results] == [0, 1, 2]
+
+    assert results[0].code.co_names == ("y",)
+    assert results[0].error is None
+
+    failed = results[1]
+    assert failed.code is None
+    assert isinstance(failed.error, DialectError)
+    assert str(failed.error) == "failed here"
+    assert (failed.error.filename, failed.error.line) == ("failing.py", 2)
+
+    syntax = results[2]
+    assert syntax.filename == "<string>"
+    assert str(syntax.error).startswith("SyntaxError")
+    assert syntax.error.line == 1
+
+
+def test_apply_dialects_many_bounds_pending_items(x_to_y_dialect):
+    taken = []
+
+    def items():
+        for i in range(10):
+            taken.append(i)
+            yield f"x = {i}", "test", f"{i}.py"
+
+    results = apply_dialects_many(items(), workers=1, max_pending=2, marshalled=True)
+    first = next(results)
+    assert len(taken) == 2
+    assert first == BatchResult(0, "0.py", first.code)
+    assert marshal.loads(first.code).co_filename == "0.py"
+    assert len(list(results)) == 9
+
+
+def test_dialect_errors_can_be_pickled():
+    error = pickle.loads(pickle.dumps(DialectError("message", "file.py", 3)))
+    assert (str(error), error.filename, error.line) == ("message", "file.py", 3)
@@ -1,11 +1,19 @@
 import ast
+import io
+import sys
+import tokenize
+from importlib.metadata import EntryPoint
 from pathlib import Path
 
 import pytest
 
 import pyalect
 from pyalect.dialect import (
+    ENTRY_POINT_GROUP,
     Dialect,
+    VisitorDialect,
+    apply_dialects,
+    dialect_fingerprint,
     dialect_reducer,
     find_file_dialects,
     find_source_dialects,
@@ -48,6 +56,13 @@ def make_dialect(name):
         ("# dialect    =   test1,    test2", ["test1", "test2"]),
         ("# dialect    =   test1    ,    test2", ["test1", "test2"]),
         ("# dialect = test1, test2, test3", ["test1", "test2", "test3"]),
+        ("# dialect=test\r\nx = 1", ["test"]),
+        ("\ufeff# dialect=test", ["test"]),
+        ("x = (\n# dialect=test\n1)", ["test"]),
+        ("x = 1  # dialect=test", ["test"]),
+        ("'''\ndocstring\n'''  # dialect=test", ["test"]),
+        ("f'{x}'  # dialect=test", ["test"]),
+        ("x = 1 \\\n  # dialect=test", ["test"]),
     ],
 )
 def test_dialects_in_source(source, expected):
@@ -62,12 +77,66 @@ def test_dialects_in_source(source, expected):
         "'a docstring'\n# dialect=test",
         "\n# coding=utf-8\n'a docstring'\n# dialect=test",
         "# dialect=test1 test2",
+        "'''\n# dialect=test\n'''",
+        "x = 1\r\n# dialect=test",
+        "f'{x}'\n# dialect=test",
+        "x = 1\r# dialect=test",
+        "x = 1)\n# dialect=test",
     ],
 )
 def test_no_dialect_found_in_source(source):
     assert find_source_dialects(source) == []
 
 
+@pytest.mark.parametrize(
+    "source",
+    [
+        # how these tokenize depends on the version of Python
+        b"\\\n\n# dialect=test\n",
+        b"\\\n# comment\n# dialect=test\n",
+        b" \\\r\n\r\n# dialect=test",
+        b"\\\n# dialect=test\n",
+    ],
+)
+def test_dialects_after_leading_line_continuation(source):
+    assert find_source_dialects(source) == tokenizer_dialects(source)
+
+
+def tokenizer_dialects(source):
+    for token in tokenize.tokenize(io.BytesIO(source).readline):
+        if token.type == tokenize.NEWLINE:
+            return []
+        if token.type == tokenize.COMMENT and "dialect=" in token.string:
+            return [token.string.split("=", 1)[1].strip()]
+    return []
+
+
+def test_dialect_after_long_docstring():
+    docstring = "'''" + "a docstring\n" * 10000 + "'''"
+    assert find_source_dialects(docstring + "  # dialect=test") == ["test"]
+    assert find_source_dialects(docstring + "\n# dialect=test") == []
+
+
+def test_dialect_with_coding_cookie():
+    source = "# coding=latin-1\n# dialect=t\xe9st\nx = 1".encode("latin-1")
+    assert find_source_dialects(source) == ["t\xe9st"]
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        b"# dialect=t\xff\n",
+        b"\xef\xbb\xbf# coding=latin-1\n",
+        b"# coding=bogus\n# dialect=test",
+        b"x = (1, \\ \n 2)",
+        b"x = 1 \\\n",
+    ],
+)
+def test_invalid_source_header(source):
+    with pytest.raises((SyntaxError, tokenize.TokenError)):
+        find_source_dialects(source)
+
+
 def test_file_has_no_dialect():
     no_dialect_file = Path(__file__).parent / "mock_package" / "no_dialect"
     assert find_file_dialects(no_dialect_file) == []
@@ -233,3 +302,346 @@ def test_dialect_reducer_from_list_of_names():
     reducer = pyalect.dialect.dialect_reducer(["x", "y", "z"])
     for dia, cls in zip(reducer, dialects):
         assert isinstance(dia, cls)
+
+
+def test_visitor_dialects_are_fused():
+    walks = []
+
+    class Double(VisitorDialect, name="double"):
+        def visit_Module(self, node):
+            walks.append(self.name)
+            return node
+
+        def visit_Constant(self, node):
+            return ast.Constant(node.value * 2)
+
+    class Increment(VisitorDialect, name="increment"):
+        def visit_Module(self, node):
+            walks.append(self.name)
+            return node
+
+        def visit_Constant(self, node):
+            return ast.Constant(node.value + 1)
+
+    tree = apply_dialects("x = 1", "double, increment")
+    assert walks == ["double", "increment"]
+    assert tree.body[0].value.value == 3
+
+
+def test_visitor_dialect_sees_replaced_node_type():
+    class NameToConstant(VisitorDialect, name="to_constant"):
+        def visit_Name(self, node):
+            return ast.Constant(1)
+
+    class Double(VisitorDialect, name="double"):
+        def visit_Constant(self, node):
+            return ast.Constant(node.value * 2)
+
+    tree = apply_dialects("print(x)", "to_constant, double")
+    assert tree.body[0].value.args[0].value == 2
+
+
+def test_visitor_dialect_remove_and_expand_nodes():
+    class Statements(VisitorDialect, name="statements"):
+        def visit_Pass(self, node):
+            return None
+
+        def visit_Expr(self, node):
+            return [node, node]
+
+    tree = apply_dialects("pass\nf()", "statements")
+    assert [type(n) for n in tree.body] == [ast.Expr, ast.Expr]
+
+
+@pytest.mark.parametrize(
+    "source", ["z = a", "z = [a, x]\nf(a)", "if a:\n    b = a\nelse:\n    pass"]
+)
+def test_fused_visitors_match_separate_traversals(source):
+    visited = []
+
+    class Expand(VisitorDialect, name="expand"):
+        def visit_Assign(self, node):
+            return [node, ast.Expr(ast.Name("a", ast.Load()))]
+
+    class Wrap(VisitorDialect, name="wrap"):
+        def visit_Name(self, node):
+            if node.id != "a":
+                return node
+            return ast.Call(ast.Name("f", ast.Load()), [ast.Name("x", ast.Load())], [])
+
+    class Rename(VisitorDialect, name="rename"):
+        def visit_Name(self, node):
+            visited.append(node.id)
+            return ast.Name("y", node.ctx) if node.id == "x" else node
+
+    fused = apply_dialects(source, "expand, wrap, rename")
+    fused_visits = sorted(visited)
+    visited.clear()
+
+    separate = ast.parse(source)
+    for cls in [Expand, Wrap, Rename]:
+        separate = cls().transform_ast(separate)
+    assert ast.dump(fused) == ast.dump(separate)
+    assert fused_visits == sorted(visited)
+
+
+def test_whole_tree_dialects_split_fused_visitors():
+    calls = []
+
+    class First(VisitorDialect, name="first"):
+        def visit_Module(self, node):
+            calls.append("first")
+            return node
+
+    class WholeTree(Dialect, name="whole_tree"):
+        def transform_ast(self, node):
+            calls.append("whole_tree")
+            return node
+
+    class Last(VisitorDialect, name="last"):
+        def visit_Module(self, node):
+            calls.append("last")
+            return node
+
+        def transform_ast(self, node):
+            calls.append("last_transform")
+            return super().transform_ast(node)
+
+    apply_dialects("x = 1", "first, whole_tree, last")
+    assert calls == ["first", "whole_tree", "last_transform", "last"]
+
+
+def test_visitor_dialect_must_return_root_node():
+    class RemoveModule(VisitorDialect, name="remove"):
+        def visit_Module(self, node):
+            return None
+
+    with pytest.raises(TypeError):
+        apply_dialects("x = 1", "remove")
+
+
+@pytest.fixture
+def entry_points(tmp_path, monkeypatch):
+    (tmp_path / "entry_point_dialects.py").write_text(
+        "from pyalect import Dialect\n"
+        "class Lazy(Dialect, name='lazy'):\n"
+        "    pass\n"
+        "class Misnamed(Dialect, name='misnamed'):\n"
+        "    pass\n"
+        "not_a_dialect = object()\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "entry_point_dialects", raising=False)
+    monkeypatch.setattr(pyalect.dialect, "_ENTRY_POINTS_LOADED", False)
+    monkeypatch.setattr(
+        pyalect.dialect,
+        "_dialect_entry_points",
+        lambda: [
+            EntryPoint(name, f"entry_point_dialects:{attr}", ENTRY_POINT_GROUP)
+            for name, attr in [
+                ("lazy", "Lazy"),
+                ("wrong_name", "Misnamed"),
+                ("not_a_dialect", "not_a_dialect"),
+                ("invalid-name", "Lazy"),
+            ]
+        ],
+    )
+
+
+def test_entry_point_dialects_are_imported_when_used(entry_points):
+    assert pyalect.registered() == {"lazy", "wrong_name", "not_a_dialect"}
+    assert "entry_point_dialects" not in sys.modules
+
+    apply_dialects("x = 1", "lazy")
+    cls = sys.modules["entry_point_dialects"].Lazy
+    assert isinstance(dialect_reducer("lazy")[0], cls)
+    assert dialect_fingerprint("lazy") is not None
+
+
+def test_bad_entry_point_dialects(entry_points):
+    with pytest.raises(ValueError, match="refers to"):
+        dialect_reducer("wrong_name")
+    with pytest.raises(TypeError, match="is not a 'Dialect'"):
+        dialect_reducer("not_a_dialect")
+
+
+def test_register_replaces_entry_point_dialect(entry_points):
+    class Replacement(Dialect, name="lazy"):
+        pass
+
+    assert isinstance(dialect_reducer("lazy")[0], Replacement)
+    assert "entry_point_dialects" not in sys.modules
+
+
+def test_deregister_entry_point_dialect(entry_points):
+    pyalect.deregister("lazy")
+    assert "lazy" not in pyalect.registered()
+
+
+class Rename(Dialect):
+    """Renames one name token to another."""
+
+    old: str
+    new: str
+
+    def transform_tokens(self, tokens):
+        for token in tokens:
+            if token.type == tokenize.NAME and token.string == self.old:
+                token = token._replace(string=self.new)
+            yield token
+
+
+def test_token_dialects_share_one_tokenization(monkeypatch):
+    class XToY(Rename, name="x_to_y"):
+        old, new = "x", "y"
+
+    class YToZ(Rename, name="y_to_z"):
+        old, new = "y", "z"
+
+    calls = []
+    original = tokenize.generate_tokens
+
+    def generate_tokens(readline):
+        calls.append(readline)
+        return original(readline)
+
+    monkeypatch.setattr(tokenize, "generate_tokens", generate_tokens)
+
+    reducer = dialect_reducer("x_to_y, y_to_z")
+    assert reducer.transform_src("x = 1  # comment\nprint(x)\n") == (
+        "z = 1  # comment\nprint(z)\n"
+    )
+    assert len(calls) == 1
+
+
+def test_token_dialects_between_source_dialects():
+    class XToY(Rename, name="x_to_y"):
+        old, new = "x", "y"
+
+    class Replace(Dialect, name="replace"):
+        def transform_src(self, source):
+            return source.replace("y", "x")
+
+    class XToZ(Rename, name="x_to_z"):
+        old, new = "x", "z"
+
+    reducer = dialect_reducer("x_to_y, replace, x_to_z")
+    assert reducer.transform_src("x = 1\n") == "z = 1\n"
+
+
+def test_token_dialect_transform_src():
+    class XToY(Rename, name="x_to_y"):
+        old, new = "x", "y"
+
+    assert XToY().transform_src("x = 1\n") == "y = 1\n"
+
+
+def test_reducer_skips_stages_which_arent_implemented():
+    calls = []
+
+    class SourceOnly(Dialect, name="source_only"):
+        def transform_src(self, source):
+            calls.append("source_only")
+            return source
+
+    class First(VisitorDialect, name="first"):
+        def visit_Module(self, node):
+            calls.append("first")
+            return node
+
+    class Second(VisitorDialect, name="second"):
+        def visit_Module(self, node):
+            calls.append("second")
+            return node
+
+    reducer = dialect_reducer("first, source_only, second")
+    assert reducer._plan == (
+        (("src", (1,)),),
+        (("visit", (0, 2)),),
+    )
+    apply_dialects("x = 1", "first, source_only, second")
+    assert calls == ["source_only", "first", "second"]
+
+
+def test_dialect_declares_its_stages():
+    class AstOnly(Dialect, name="ast_only"):
+        stages = ("ast",)
+
+        def transform_src(self, source):
+            raise AssertionError("transform_src should be skipped")
+
+        def transform_ast(self, node):
+            return ast.parse("y = 2")
+
+    tree = apply_dialects("x = 1", "ast_only")
+    assert tree.body[0].targets[0].id == "y"
+
+
+def test_dialect_with_invalid_stages():
+    with pytest.raises(ValueError, match="Expected stages"):
+
+        class BadStages(Dialect):
+            stages = ("src", "bytecode")
+
+
+def test_reducer_plan_is_cached():
+    class First(VisitorDialect, name="first"):
+        pass
+
+    class XToY(Rename, name="x_to_y"):
+        old, new = "x", "y"
+
+    first = dialect_reducer("first, x_to_y")
+    second = dialect_reducer("first, x_to_y")
+    assert first._plan is second._plan
+    assert first._plan == ((("tokens", (1,)),), (("visit", (0,)),))
+
+
+def test_dialect_setup_is_called_once():
+    calls = []
+
+    class Prepared(Dialect, name="prepared"):
+        @classmethod
+        def setup(cls):
+            calls.append(cls)
+
+    first = dialect_reducer("prepared")[0]
+    second = dialect_reducer("prepared")[0]
+    assert calls == [Prepared]
+    assert first is not second
+
+
+def test_failed_dialect_setup_is_retried():
+    attempts = []
+
+    class Flaky(Dialect, name="flaky"):
+        @classmethod
+        def setup(cls):
+            attempts.append(cls)
+            if len(attempts) == 1:
+                raise RuntimeError("not ready")
+
+    with pytest.raises(RuntimeError, match="not ready"):
+        dialect_reducer("flaky")
+    dialect_reducer("flaky")
+    dialect_reducer("flaky")
+    assert len(attempts) == 2
+
+
+def test_reusable_dialect_instance_is_shared():
+    class Stateless(VisitorDialect, name="stateless"):
+        reusable = True
+
+        def visit_Constant(self, node):
+            return ast.Constant(node.value * 2)
+
+    first = dialect_reducer("stateless", "first.py")[0]
+    second = dialect_reducer("stateless", "second.py")[0]
+    assert first is second
+    assert first.filename is None
+    assert apply_dialects("x = 1", "stateless").body[0].value.value == 2
+
+    class Subclass(Stateless, name="stateless_subclass"):
+        pass
+
+    assert dialect_reducer("stateless_subclass")[0] is not first
@@ -0,0 +1,157 @@
+import ast
+import importlib
+import sys
+import types
+
+import pytest
+
+from pyalect import Dialect, DialectError
+from pyalect.cli import main
+from pyalect.export import _line_unparser, export_paths, export_source, unparse
+
+
+@pytest.fixture
+def package(make_package, tmp_path):
+    return make_package(
+        "exported",
+        {
+            "__init__.py": "# dialect=test\nx = 1\n",
+            "sub/__init__.py": "",
+            "sub/module.py": "# dialect=test\n\ndef f():\n\n    return x\n",
+            "plain.py": "x = 3  # comment\n",
+        },
+        parent=tmp_path / "source",
+    )
+
+
+ADJACENT_DEFINITIONS = (
+    "def a():\n"
+    "    return 1\n"
+    "def b():\n"
+    "    return 2\n"
+    "class C:\n"
+    "    x = 1\n"
+    "    def m(self):\n"
+    "        return self.x\n"
+    "    @property\n"
+    "    def p(self):\n"
+    "        return 2\n"
+    "@decorator\n"
+    "def d():\n"
+    "    pass\n"
+    "y = 3\n"
+)
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        (
+            '"""docstring"""\n'
+            "import os\n"
+            "\n"
+            "x = [\n"
+            "    1,\n"
+            "]\n"
+            "\n"
+            "\n"
+            "@decorator\n"
+            "def f(a):\n"
+            "\n"
+            "    if a:\n"
+            "\n"
+            "        return 1\n"
+            "    return 2\n"
+            "\n"
+            "\n"
+            "class C:\n"
+            "    pass\n"
+        ),
+        ADJACENT_DEFINITIONS,
+        "\n" + ADJACENT_DEFINITIONS,
+    ],
+)
+def test_unparse_keeps_line_numbers(source):
+    tree = ast.parse(source)
+    new_tree = ast.parse(unparse(tree))
+    assert [
+        (type(node).__name__, node.lineno)
+        for node in ast.walk(new_tree)
+        if isinstance(node, ast.stmt)
+    ] == [
+        (type(node).__name__, node.lineno)
+        for node in ast.walk(tree)
+        if isinstance(node, ast.stmt)
+    ]
+
+
+def test_unparse_without_room_for_original_lines():
+    tree = ast.parse("x = (\n    1\n)\ny = 2\n")
+    tree.body[1].lineno = 2
+    assert unparse(tree) == "x = 1\ny = 2\n"
+
+
+def test_unparse_finds_the_unparser_when_first_used(monkeypatch):
+    # as in Python 3.14, where ast._Unparser is only bound by ast.unparse()
+    unparser_module = types.ModuleType("_ast_unparse")
+    unparser_module.Unparser = ast._Unparser
+    monkeypatch.setitem(sys.modules, "_ast_unparse", unparser_module)
+    monkeypatch.delattr(ast, "_Unparser")
+    _line_unparser.cache_clear()
+    try:
+        assert unparse(ast.parse("x = 1\n\n\ny = 2\n")) == "x = 1\n\n\ny = 2\n"
+    finally:
+        _line_unparser.cache_clear()
+
+
+def test_export_source(x_to_y_dialect):
+    assert export_source("# dialect=test\n\nx = 1\n", "test") == "\n\ny = 1\n"
+
+
+def test_export_source_reraises_dialect_errors():
+    class Broken(Dialect, name="broken"):
+        def transform_src(self, source):
+            raise DialectError("cannot export", self.filename, 2)
+
+    with pytest.raises(DialectError, match="cannot export"):
+        export_source("x = 1\n", "broken", "module.py")
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_export_paths(package, x_to_y_dialect, tmp_path, monkeypatch, workers):
+    output = tmp_path / "output"
+    results = list(export_paths([package], output, workers=workers))
+    assert {r.output: r.status for r in results} == {
+        str(output / "exported" / "__init__.py"): "exported",
+        str(output / "exported" / "plain.py"): "copied",
+        str(output / "exported" / "sub" / "__init__.py"): "copied",
+        str(output / "exported" / "sub" / "module.py"): "exported",
+    }
+    assert (output / "exported" / "plain.py").read_text() == "x = 3  # comment\n"
+    assert (output / "exported" / "sub" / "module.py").read_text() == (
+        "\n\ndef f():\n\n    return y\n"
+    )
+
+    monkeypatch.syspath_prepend(str(output))
+    monkeypatch.delitem(sys.modules, "exported", raising=False)
+    assert importlib.import_module("exported").y == 1
+    del sys.modules["exported"]
+
+
+def test_export_failures(package, x_to_y_dialect, tmp_path):
+    (package / "broken.py").write_text("# dialect=test\nx = (\n")
+    results = {r.path: r for r in export_paths([package / "broken.py"], tmp_path)}
+    result = results[str(package / "broken.py")]
+    assert (result.status, result.line) == ("failed", 2)
+    assert result.error.startswith("SyntaxError")
+    assert not (tmp_path / "broken.py").exists()
+
+
+def test_export_command(package, x_to_y_dialect, tmp_path, capsys):
+    output = tmp_path / "output"
+    assert main(["export", "-o", str(output), str(package)]) == 0
+    assert f"Exported 2 modules to {str(output)!r}" in capsys.readouterr().out
+
+    (package / "broken.py").write_text("# dialect=test\nx = (\n")
+    assert main(["export", "-o", str(output), str(package)]) == 1
+    assert "Failed to export" in capsys.readouterr().err
@@ -1,7 +1,16 @@
+import importlib
+import os
+import pkgutil
 import re
+import sys
 import traceback
+from importlib.machinery import SourceFileLoader
 
-from pyalect import Dialect, DialectError
+import pytest
+
+from pyalect import Dialect, DialectError, importer
+from pyalect.errors import reraise_dialect_error
+from pyalect.importer import PyalectFinder, PyalectLoader, PyalectPathFinder
 
 
 def test_imports():
@@ -42,3 +51,242 @@ def test_raise_dialect_error_on_import():
         assert bool(re.match(_tb_template, traceback.format_exc(), re.DOTALL))
     else:
         assert False, f"Did not raise {DialectError}"
+
+
+def test_finder_caches_files_without_dialects(tmp_path, monkeypatch):
+    calls = []
+    original = importer.find_file_dialects
+
+    def find_file_dialects(filename):
+        calls.append(filename)
+        return original(filename)
+
+    monkeypatch.setattr(importer, "find_file_dialects", find_file_dialects)
+
+    module = tmp_path / "plain.py"
+    module.write_text("x = 1\n")
+
+    finder = PyalectFinder()
+    assert finder.find_spec("plain", [str(tmp_path)]) is None
+    assert finder.find_spec("plain", [str(tmp_path)]) is None
+    assert len(calls) == 1
+
+    module.write_text("# dialect=test\nx = 1\n")
+    spec = finder.find_spec("plain", [str(tmp_path)])
+    assert len(calls) == 2
+    assert spec.loader.dialects == ["test"]
+
+
+def test_finder_refreshes_directory_listing(tmp_path):
+    finder = PyalectFinder()
+    assert finder.find_spec("new", [str(tmp_path)]) is None
+
+    package = tmp_path / "new"
+    package.mkdir()
+    (package / "__init__.py").write_text("# dialect=test\n")
+    # make sure the directory's mtime is seen to change
+    os.utime(tmp_path, ns=(0, 0))
+
+    spec = finder.find_spec("new", [str(tmp_path)])
+    assert spec.submodule_search_locations == [str(package)]
+
+
+def test_finder_invalidate_caches(tmp_path):
+    (tmp_path / "mod.py").write_text("# dialect=test\n")
+    finder = PyalectFinder()
+    spec = finder.find_spec("mod", [str(tmp_path)])
+    assert finder.find_spec("mod", [str(tmp_path)]) is spec
+    finder.invalidate_caches()
+    assert finder.find_spec("mod", [str(tmp_path)]) is not spec
+
+
+def test_top_level_import_from_sys_path(tmp_path, monkeypatch):
+    class MyDialect(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            return source.replace("x", "y")
+
+    (tmp_path / "top_level_dialect_module.py").write_text("# dialect=test\nx = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    module = importlib.import_module("top_level_dialect_module")
+    assert isinstance(module.__spec__.loader, PyalectLoader)
+    assert module.y == 1
+    assert isinstance(sys.path_importer_cache[str(tmp_path)], PyalectPathFinder)
+
+
+def test_path_finder_leaves_normal_modules_alone(tmp_path):
+    (tmp_path / "plain.py").write_text("x = 1\n")
+    finder = PyalectPathFinder(str(tmp_path))
+    spec = finder.find_spec("plain")
+    assert type(spec.loader) is SourceFileLoader
+    assert PyalectFinder().find_spec("plain", [str(tmp_path)]) is None
+
+
+def test_path_finder_lists_modules(tmp_path, monkeypatch):
+    import email
+
+    (tmp_path / "plain.py").write_text("x = 1\n")
+    (tmp_path / "package").mkdir()
+    (tmp_path / "package" / "__init__.py").write_text("")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    importlib.invalidate_caches()
+
+    modules = list(pkgutil.iter_modules([str(tmp_path)]))
+    assert isinstance(modules[0].module_finder, PyalectPathFinder)
+    assert [(m.name, m.ispkg) for m in modules] == [("package", True), ("plain", False)]
+    assert "email.message" in {
+        m.name for m in pkgutil.iter_modules(email.__path__, "email.")
+    }
+
+
+def test_path_hook_rejects_non_directories(tmp_path):
+    with pytest.raises(ImportError):
+        PyalectPathFinder.path_hook()(str(tmp_path / "missing"))
+
+
+def test_uninstall_and_install():
+    try:
+        importer.uninstall()
+        assert not any(
+            isinstance(finder, PyalectPathFinder)
+            for finder in sys.path_importer_cache.values()
+        )
+        importer.uninstall()  # no-op
+    finally:
+        importer.install()
+    assert sys.path_hooks[0] is importer._PATH_HOOK
+
+
+def test_pytest_does_not_take_over_dialect_test_modules(pytester):
+    pytester.makeconftest(
+        """
+        from pyalect import Dialect
+
+        class Swap(Dialect):
+            name = "swap"
+
+            def transform_src(self, source):
+                return source.replace("MAGIC", "42")
+        """
+    )
+    pytester.makepyfile(
+        test_dia="""
+        # dialect=swap
+        def test_swapped():
+            assert "MAGIC" == "42"
+        """
+    )
+    pytester.makepyfile(
+        test_plain="""
+        def test_rewritten():
+            assert [1] == [2]
+        """
+    )
+    result = pytester.runpytest("-p", "no:cacheprovider")
+    result.assert_outcomes(passed=1, failed=1)
+    # modules without dialects still have their assertions rewritten
+    result.stdout.fnmatch_lines(["*assert [[]1[]] == [[]2[]]*"])
+
+
+@pytest.mark.parametrize("packages", [(), ("lazy_package",)])
+def test_lazy_import(tmp_path, monkeypatch, packages):
+    calls = []
+
+    class MyDialect(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            calls.append(source)
+            return source
+
+    package = tmp_path / "lazy_package"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "module.py").write_text("# dialect=test\nx = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "lazy_package", raising=False)
+    monkeypatch.delitem(sys.modules, "lazy_package.module", raising=False)
+
+    importer.lazy(*packages)
+    try:
+        module = importlib.import_module("lazy_package.module")
+    finally:
+        importer.lazy(*packages, enabled=False)
+
+    assert calls == []
+    assert module.x == 1
+    assert len(calls) == 1
+
+
+def test_is_lazy():
+    importer.lazy("a.b")
+    try:
+        assert importer.is_lazy("a.b")
+        assert importer.is_lazy("a.b.c")
+        assert not importer.is_lazy("a")
+        assert not importer.is_lazy("a.bc")
+    finally:
+        importer.lazy(enabled=False)
+    assert not importer.is_lazy("a.b")
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("", (False, set())),
+        ("0", (False, set())),
+        ("1", (True, set())),
+        ("a, b.c", (False, {"a", "b.c"})),
+    ],
+)
+def test_lazy_from_environ(value, expected):
+    assert importer._lazy_from_environ(value) == expected
+
+
+def test_finder_spec_cache_is_validated(tmp_path):
+    module = tmp_path / "changing.py"
+    module.write_text("# dialect=test\nx = 1\n")
+    finder = PyalectFinder()
+    spec = finder.find_spec("changing", [str(tmp_path)])
+    assert spec.loader.dialects == ["test"]
+    assert finder.find_spec("changing", [str(tmp_path)]) is spec
+
+    module.write_text("# dialect=test, other\nx = 1\n")
+    spec = finder.find_spec("changing", [str(tmp_path)])
+    assert spec.loader.dialects == ["test", "other"]
+
+    module.write_text("x = 1\n")
+    assert finder.find_spec("changing", [str(tmp_path)]) is None
+
+
+def test_dialect_error_traceback_points_to_line(tmp_path):
+    class MyDialect(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            raise DialectError("bad line", self.filename, 5000)
+
+    path = tmp_path / "large.py"
+    path.write_text("# dialect=test\n" + "x = 1\n" * 6000)
+    loader = PyalectLoader(["test"], "large", str(path))
+    with pytest.raises(DialectError) as error:
+        loader.source_to_code(path.read_bytes(), str(path))
+    last = traceback.extract_tb(error.value.__traceback__)[-1]
+    assert (last.filename, last.lineno, last.name) == (
+        str(path),
+        5000,
+        "source_to_code",
+    )
+    assert last.line == "x = 1"
+
+
+def test_reraise_dialect_error_outside_except():
+    with pytest.raises(RuntimeError, match="No error to reraise"):
+        reraise_dialect_error()
+    with pytest.raises(TypeError, match="must be a 'DialectError'"):
+        try:
+            raise ValueError()
+        except ValueError:
+            reraise_dialect_error()
@@ -0,0 +1,134 @@
+import ast
+import importlib
+import json
+import sys
+
+import pytest
+
+from pyalect import Dialect, VisitorDialect, instrument
+from pyalect.dialect import apply_dialects
+
+
+@pytest.fixture
+def enabled():
+    instrument.reset()
+    instrument.enable()
+    yield
+    instrument.enable(False)
+    instrument.reset()
+
+
+def test_disabled_by_default():
+    assert not instrument.is_enabled()
+    with instrument.measure("parse", "test", "module"):
+        pass
+    instrument.count("counter")
+    assert instrument.report() == ({}, {}, {})
+
+
+def test_import_stages(enabled, tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+
+    class MyDialect(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            return source
+
+        def transform_ast(self, node):
+            return node
+
+    (tmp_path / "timed_module.py").write_text("# dialect=test\nx = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "timed_module", raising=False)
+    importlib.import_module("timed_module")
+
+    report = instrument.report()
+    assert set(report.modules["timed_module"]) == {
+        "find",
+        "cache_load",
+        "read",
+        "decode",
+        "transform_src",
+        "parse",
+        "transform_ast",
+        "compile",
+        "cache_dump",
+    }
+    assert set(report.dialects["test"]) == {"transform_src", "transform_ast"}
+    assert report.counters["code_cache_misses"] == 1
+    assert "code_cache_hits" not in report.counters
+
+    del sys.modules["timed_module"]
+    importlib.import_module("timed_module")
+    assert instrument.report().counters["code_cache_hits"] == 1
+
+
+def test_fused_visitors_are_reported_together(enabled):
+    class First(VisitorDialect, name="first"):
+        pass
+
+    class Second(VisitorDialect, name="second"):
+        pass
+
+    with instrument.module("module"):
+        apply_dialects("x = 1", "first, second")
+
+    report = instrument.report()
+    assert set(report.dialects) == {"first+second"}
+    assert set(report.dialects["first+second"]) == {"transform_ast"}
+    assert set(report.modules["module"]) == {"parse", "transform_ast"}
+
+
+def test_stages_outside_a_module_only_count_for_dialects(enabled):
+    class MyDialect(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            return source
+
+        def transform_ast(self, node):
+            return node
+
+    apply_dialects("x = 1", "test")
+    report = instrument.report()
+    assert report.modules == {}
+    assert set(report.dialects["test"]) == {"transform_src", "transform_ast"}
+
+
+def test_report_formats(enabled):
+    with instrument.module("module"):
+        with instrument.measure("parse"):
+            ast.parse("x = 1")
+        with instrument.measure("custom", "test"):
+            pass
+    instrument.count("code_cache_hits")
+
+    report = instrument.report()
+    assert json.loads(report.to_json()) == report._asdict()
+
+    lines = report.format_table().splitlines()
+    assert lines[0].split() == ["module", "parse", "custom", "total"]
+    assert lines[1].split()[0] == "module"
+    assert lines[3].split() == ["dialect", "custom", "total"]
+    assert lines[4].split()[0] == "test"
+    assert lines[-1].split() == ["code_cache_hits", "1"]
+
+
+def test_report_at_exit(enabled, tmp_path, capsys):
+    instrument.count("code_cache_hits")
+
+    instrument._report_at_exit("1")
+    assert "code_cache_hits  1" in capsys.readouterr().err
+
+    path = tmp_path / "report.json"
+    instrument._report_at_exit(str(path))
+    assert json.loads(path.read_text())["counters"] == {"code_cache_hits": 1}
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("", None), ("0", None), ("false", None), ("1", "1"), (" a.json ", "a.json")],
+)
+def test_from_environ(value, expected):
+    assert instrument._from_environ(value) == expected
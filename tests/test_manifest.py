@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from pyalect import Dialect, instrument
+from pyalect.cli import main
+from pyalect.importer import PyalectPathFinder
+from pyalect.manifest import (
+    ManifestEntry,
+    load_manifest,
+    manifest_path,
+    update_manifest,
+    update_manifests,
+)
+
+
+@pytest.fixture
+def package(tmp_path):
+    root = tmp_path / "package"
+    (root / "sub").mkdir(parents=True)
+    (root / "__init__.py").write_text("")
+    (root / "module.py").write_text("# dialect=test\nx = 1\n")
+    (root / "sub" / "other.py").write_text("# dialect=a, b\n")
+    (root / "data.txt").write_text("# dialect=test\n")
+    return root
+
+
+@pytest.fixture
+def enabled():
+    instrument.reset()
+    instrument.enable()
+    yield
+    instrument.enable(False)
+    instrument.reset()
+
+
+def test_update_manifest(package):
+    assert update_manifest(package)
+    manifest = load_manifest(package)
+    assert set(manifest) == {"__init__.py", "module.py"}
+    st = os.stat(package / "module.py")
+    assert manifest["module.py"] == ManifestEntry(["test"], st.st_mtime_ns, st.st_size)
+    assert manifest["__init__.py"].dialects == []
+
+
+def test_update_manifest_is_incremental(package, monkeypatch):
+    update_manifest(package)
+    assert not update_manifest(package)
+
+    scanned = []
+    monkeypatch.setattr(
+        "pyalect.manifest.find_file_dialects",
+        lambda path: scanned.append(os.path.basename(path)) or ["other"],
+    )
+    (package / "module.py").write_text("# dialect=other\nx = 12\n")
+    assert update_manifest(package)
+    assert scanned == ["module.py"]
+    assert load_manifest(package)["module.py"].dialects == ["other"]
+
+
+def test_unreadable_files_are_left_out(package):
+    (package / "bad.py").write_bytes(b"# coding: not-an-encoding\n")
+    update_manifest(package)
+    assert "bad.py" not in load_manifest(package)
+
+
+@pytest.mark.parametrize(
+    "content", [b"", b"not json", b'{"version": 0, "files": {}}', b'{"files": 1}']
+)
+def test_invalid_manifest_is_ignored(package, content):
+    path = manifest_path(package)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "wb") as f:
+        f.write(content)
+    assert load_manifest(package) == {}
+
+
+def test_update_manifests(package):
+    assert update_manifests([package]) == [str(package), str(package / "sub")]
+    assert load_manifest(package / "sub")["other.py"].dialects == ["a", "b"]
+    assert update_manifests([package]) == []
+
+
+def test_manifest_command(package, capsys):
+    assert main(["manifest", str(package)]) == 0
+    assert f"Updated manifest for {str(package / 'sub')!r}" in capsys.readouterr().out
+
+
+def test_finder_uses_manifest(package, enabled, monkeypatch):
+    update_manifest(package)
+    monkeypatch.setattr(
+        "pyalect.importer.find_file_dialects",
+        lambda path: pytest.fail(f"{path} should not be read"),
+    )
+
+    class MyDialect(Dialect):
+        name = "test"
+
+    spec = PyalectPathFinder(str(package)).find_spec("module")
+    assert spec.loader.dialects == ["test"]
+    assert instrument.report().counters["manifest_hits"] == 1
+
+
+def test_finder_reads_files_changed_since_the_manifest(package, monkeypatch):
+    update_manifest(package)
+    (package / "module.py").write_text("# dialect=other\nx = 12\n")
+
+    class MyDialect(Dialect):
+        name = "other"
+
+    spec = PyalectPathFinder(str(package)).find_spec("module")
+    assert spec.loader.dialects == ["other"]
@@ -0,0 +1,169 @@
+import os
+import sys
+
+import pytest
+
+import pyalect
+from pyalect import Dialect, precompile
+from pyalect.cache import cache_path, load_code
+from pyalect.cli import main
+from pyalect.precompile import (
+    check_paths,
+    compile_paths,
+    dialect_modules,
+    find_source_files,
+)
+
+
+@pytest.fixture
+def package(make_package):
+    return make_package(
+        "precompiled",
+        {
+            "__init__.py": "",
+            "dialect.py": "# dialect=test\nx = 1\n",
+            "broken.py": "# dialect=test\nx = (\n",
+            "__pycache__/ignored.py": "# dialect=test\n",
+        },
+    )
+
+
+def results_by_name(results):
+    return {r.path.rsplit("/", 1)[1]: r for r in results}
+
+
+def test_find_source_files(package):
+    assert [p.rsplit("/", 1)[1] for p in find_source_files([package])] == [
+        "__init__.py",
+        "broken.py",
+        "dialect.py",
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_compile_paths(package, x_to_y_dialect, workers):
+    results = results_by_name(compile_paths([package], workers=workers))
+    assert results["__init__.py"].status == "skipped"
+    assert results["dialect.py"].status == "compiled"
+    assert results["broken.py"].status == "failed"
+    assert "SyntaxError" in results["broken.py"].error
+
+    namespace = {}
+    exec(load_code(str(package / "dialect.py"), "test"), namespace)
+    assert namespace["y"] == 1
+
+
+def test_compile_paths_is_incremental(package, x_to_y_dialect):
+    list(compile_paths([package]))
+    results = results_by_name(compile_paths([package]))
+    assert results["dialect.py"].status == "current"
+
+    results = results_by_name(compile_paths([package], force=True))
+    assert results["dialect.py"].status == "compiled"
+
+    (package / "dialect.py").write_text("# dialect=test\nx = 2  # changed\n")
+    results = results_by_name(compile_paths([package]))
+    assert results["dialect.py"].status == "compiled"
+
+
+def test_compiled_code_has_absolute_filename(package, x_to_y_dialect, monkeypatch):
+    monkeypatch.chdir(package.parent)
+    list(compile_paths(["precompiled"]))
+    code = load_code(str(package / "dialect.py"), "test")
+    assert code.co_filename == str(package / "dialect.py")
+
+
+def test_dialect_modules(x_to_y_dialect):
+    class NotLocal(Dialect):
+        name = "not_local"
+
+    NotLocal.__module__ = "some.module"
+    NotLocal.__qualname__ = "NotLocal"
+    assert dialect_modules() == ["some.module"]
+
+
+def test_compile_command(package, x_to_y_dialect, capsys):
+    assert main(["compile", str(package)]) == 1
+    out, err = capsys.readouterr()
+    assert "Compiled" in out and "dialect.py" in out
+    assert "Failed to compile" in err and "broken.py" in err
+
+    (package / "broken.py").unlink()
+    assert (
+        main(
+            [
+                "compile",
+                "-q",
+                "--invalidation-mode",
+                "unchecked-hash",
+                "-f",
+                str(package),
+            ]
+        )
+        == 0
+    )
+    assert capsys.readouterr() == ("", "")
+    with open(cache_path(str(package / "dialect.py")), "rb") as f:
+        assert int.from_bytes(f.read(8)[4:], "little") == 0b01
+
+
+def test_compile_command_imports_modules(package, capsys):
+    with pytest.raises(ModuleNotFoundError):
+        main(["compile", "-i", "not_a_real_module", str(package)])
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_warmup(package, x_to_y_dialect, workers):
+    results = results_by_name(pyalect.warmup(["precompiled"], workers=workers))
+    assert results["dialect.py"].status == "compiled"
+    assert results["broken.py"].status == "failed"
+    assert sys.modules["precompiled.dialect"].y == 1
+    assert "precompiled.broken" not in sys.modules
+
+
+def test_warmup_without_cache(package, x_to_y_dialect, monkeypatch, capsys):
+    monkeypatch.setattr(precompile, "dump_code", lambda *args: False)
+    results = results_by_name(pyalect.warmup(["precompiled"], workers=1))
+    assert results["dialect.py"].status == "uncached"
+    assert sys.modules["precompiled.dialect"].y == 1
+
+    assert main(["compile", str(package / "dialect.py")]) == 0
+    assert "Could not write" in capsys.readouterr().err
+
+
+def test_warmup_single_module(tmp_path, x_to_y_dialect, monkeypatch):
+    (tmp_path / "warm_module.py").write_text("# dialect=test\nx = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, "warm_module", raising=False)
+    assert [r.status for r in pyalect.warmup(["warm_module"], workers=1)] == [
+        "compiled"
+    ]
+    assert sys.modules["warm_module"].y == 1
+
+
+def test_warmup_unknown_package():
+    with pytest.raises(ModuleNotFoundError):
+        pyalect.warmup(["not_a_real_package"])
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_check_paths_reports_every_error(package, x_to_y_dialect, workers):
+    (package / "failing.py").write_text("# dialect=test\nfail = 1\n")
+    results = results_by_name(check_paths([package], workers=workers))
+    assert results["__init__.py"].status == "skipped"
+    assert results["dialect.py"].status == "checked"
+    assert (results["broken.py"].status, results["broken.py"].line) == ("failed", 2)
+    assert results["failing.py"].status == "failed"
+    assert results["failing.py"].error == "DialectError: failed here"
+    assert results["failing.py"].line == 2
+    assert not os.path.exists(cache_path(str(package / "dialect.py")))
+
+
+def test_check_command(package, x_to_y_dialect, capsys):
+    assert main(["check", str(package)]) == 1
+    out, err = capsys.readouterr()
+    assert out.startswith(f"{package / 'broken.py'}:2: SyntaxError")
+    assert "Checked 2 modules, 1 failed" in err
+
+    (package / "broken.py").unlink()
+    assert main(["check", str(package)]) == 0
@@ -0,0 +1,100 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+from pyalect import Dialect
+from pyalect.reloader import Reloader, dialect_modules
+
+
+@pytest.fixture
+def module_file(tmp_path, monkeypatch):
+    class MyDialect(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            return source.replace("x", "y")
+
+    path = tmp_path / "reloaded_module.py"
+    path.write_text("# dialect=test\nx = 1\n")
+    (tmp_path / "plain_reloaded_module.py").write_text("x = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    for name in ["reloaded_module", "plain_reloaded_module"]:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    return path
+
+
+def test_dialect_modules(module_file):
+    module = importlib.import_module("reloaded_module")
+    importlib.import_module("plain_reloaded_module")
+    modules = dialect_modules()
+    assert modules["reloaded_module"] is module
+    assert "plain_reloaded_module" not in modules
+
+
+def test_reload_changed_modules(module_file):
+    module = importlib.import_module("reloaded_module")
+    reloader = Reloader()
+    assert reloader.check() == []
+
+    module_file.write_text("# dialect=test\nx = 2  # changed\n")
+    assert reloader.check() == ["reloaded_module"]
+    assert sys.modules["reloaded_module"] is module
+    assert module.y == 2
+    assert reloader.check() == []
+
+
+def test_reload_same_size_change_within_a_second(module_file, monkeypatch):
+    monkeypatch.setattr(sys, "dont_write_bytecode", False)
+    second = os.stat(module_file).st_mtime_ns // 1_000_000_000 * 1_000_000_000
+    os.utime(module_file, ns=(second, second))
+    module = importlib.import_module("reloaded_module")
+    reloader = Reloader()
+
+    module_file.write_text("# dialect=test\nx = 2\n")
+    os.utime(module_file, ns=(second, second + 1000))
+    assert reloader.check() == ["reloaded_module"]
+    assert module.y == 2
+
+
+def test_reload_error(module_file):
+    importlib.import_module("reloaded_module")
+    errors = []
+    reloader = Reloader(on_error=lambda name, error: errors.append((name, error)))
+
+    module_file.write_text("# dialect=test\nx = (\n")
+    assert reloader.check() == []
+    assert [name for name, _ in errors] == ["reloaded_module"]
+    assert isinstance(errors[0][1], SyntaxError)
+
+
+def test_print_reload_error(module_file, capsys):
+    importlib.import_module("reloaded_module")
+    reloader = Reloader()
+    module_file.write_text("# dialect=test\nx = (\n")
+    reloader.check()
+    assert "Failed to reload 'reloaded_module'" in capsys.readouterr().err
+
+
+def test_forget_removed_modules(module_file):
+    importlib.import_module("reloaded_module")
+    reloader = Reloader()
+    del sys.modules["reloaded_module"]
+    module_file.write_text("# dialect=test\nx = 2  # changed\n")
+    assert reloader.check() == []
+
+
+def test_reload_in_background(module_file):
+    module = importlib.import_module("reloaded_module")
+    reloader = Reloader(interval=0.01)
+    reloader.start()
+    try:
+        module_file.write_text("# dialect=test\nx = 2  # changed\n")
+        for _ in range(500):
+            if getattr(module, "y", None) == 2:
+                break
+            reloader._stopped.wait(0.01)
+    finally:
+        reloader.stop()
+    assert module.y == 2
@@ -0,0 +1,165 @@
+import os
+import socket
+import stat
+import sys
+import tempfile
+from importlib.util import MAGIC_NUMBER
+from types import SimpleNamespace
+
+import pytest
+
+from pyalect import DialectError, importer
+from pyalect.cache import dialects_key
+from pyalect.cli import main
+from pyalect.compiler import cache_clear
+from pyalect.importer import PyalectLoader
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "AF_UNIX"), reason="requires Unix domain sockets"
+)
+
+
+@pytest.fixture
+def socket_path():
+    # socket paths are limited to around 100 characters - tmp_path may be longer
+    with tempfile.TemporaryDirectory() as directory:
+        yield os.path.join(directory, "pyalect.sock")
+
+
+@pytest.fixture
+def server(socket_path):
+    from pyalect.server import start_server
+
+    cache_clear()
+    server = start_server(socket_path)
+    yield server
+    server.shutdown()
+    server.server_close()
+    cache_clear()
+
+
+@pytest.fixture
+def client(server, socket_path):
+    from pyalect.server import Client
+
+    return Client(socket_path)
+
+
+def test_client_gets_code_from_server(client, x_to_y_dialect):
+    code = client.transpile("x = 1", ["test"], "module.py")
+    assert code.co_names == ("y",)
+    assert code.co_filename == "module.py"
+    assert client.transpile("x = 1", ["test"], "module.py") == code
+    assert [c.source for c in x_to_y_dialect] == ["x = 1"]
+
+
+def test_dialect_errors_are_raised_by_client(client, x_to_y_dialect):
+    with pytest.raises(DialectError, match="failed here") as info:
+        client.transpile("fail\n", ["test"], "module.py")
+    assert (info.value.filename, info.value.line) == ("module.py", 2)
+
+
+def test_server_declines_incompatible_requests(x_to_y_dialect):
+    from pyalect.server import _reply
+
+    key = dialects_key(["test"])
+    assert _reply((MAGIC_NUMBER, key, 0, "x = 1", ["test"], "m.py"))[0] == "code"
+    assert _reply((b"bad!", key, 0, "x = 1", ["test"], "m.py")) == ("unavailable",)
+    assert _reply((MAGIC_NUMBER, b"other", 0, "x = 1", ["test"], "m.py")) == (
+        "unavailable",
+    )
+    assert _reply((MAGIC_NUMBER, key, "x = 1", ["test"], "m.py")) == ("unavailable",)
+    # the client raises errors other than dialect errors itself
+    assert _reply((MAGIC_NUMBER, key, 0, "x = (", ["test"], "m.py")) == ("unavailable",)
+
+
+def test_server_compiles_at_client_optimization_level(
+    client, x_to_y_dialect, monkeypatch
+):
+    source = "assert x\n"
+    assert client.transpile(source, ["test"], "module.py").co_names == ("y",)
+    monkeypatch.setattr(sys, "flags", SimpleNamespace(optimize=1))
+    assert client.transpile(source, ["test"], "module.py").co_names == ()
+
+
+def test_client_without_server(socket_path, x_to_y_dialect, monkeypatch):
+    from pyalect import server
+    from pyalect.server import Client
+
+    client = Client(socket_path)
+    assert client.transpile("x = 1", ["test"], "module.py") is None
+
+    # it doesn't try again for a while
+    monkeypatch.setattr(
+        Client, "_request", lambda *args: pytest.fail("should not connect")
+    )
+    assert client.transpile("x = 1", ["test"], "module.py") is None
+    monkeypatch.setattr(server, "RETRY_DELAY", 0)
+    client._retry_at = 0
+    monkeypatch.setattr(Client, "_request", lambda *args: ("unavailable",))
+    assert client.transpile("x = 1", ["test"], "module.py") is None
+
+
+def test_client_skips_dialects_without_fingerprint(client, monkeypatch):
+    monkeypatch.setattr("pyalect.server.dialects_key", lambda dialects: None)
+    client._request = lambda *args: pytest.fail("should not connect")
+    assert client.transpile("x = 1", ["test"], "<stdin>") is None
+
+
+def test_client_ignores_servers_of_other_users(client, x_to_y_dialect, monkeypatch):
+    monkeypatch.setattr(os, "getuid", lambda: os.geteuid() + 1)
+    assert client.transpile("x = 1", ["test"], "module.py") is None
+    assert [c.source for c in x_to_y_dialect] == []
+
+
+def test_socket_is_created_for_owner_only(socket_path):
+    from pyalect.server import TranspileServer
+
+    umask = os.umask(0)
+    try:
+        with TranspileServer(socket_path):
+            assert not os.stat(socket_path).st_mode & (stat.S_IRWXG | stat.S_IRWXO)
+    finally:
+        os.umask(umask)
+
+
+def test_loader_uses_server(client, x_to_y_dialect, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "_SERVER_CLIENT", client)
+    path = tmp_path / "module.py"
+    path.write_text("# dialect=test\nx = 1\n")
+    loader = PyalectLoader(["test"], "module", str(path))
+    assert loader.source_to_code(path.read_bytes(), str(path)).co_names == ("y",)
+
+    path.write_text("# dialect=test\nfail\n")
+    with pytest.raises(DialectError, match="failed here"):
+        loader.source_to_code(path.read_bytes(), str(path))
+
+
+def test_stale_socket_is_replaced(socket_path):
+    from pyalect.server import TranspileServer
+
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    with TranspileServer(socket_path):
+        with pytest.raises(OSError, match="already listening"):
+            TranspileServer(socket_path)
+    assert not os.path.exists(socket_path)
+
+
+def test_serve_command(socket_path, monkeypatch, capsys):
+    from pyalect import server
+
+    def serve(path):
+        assert path == socket_path
+        raise KeyboardInterrupt()
+
+    monkeypatch.setattr(server, "serve", serve)
+    assert main(["serve", socket_path]) == 0
+    assert socket_path in capsys.readouterr().err
+
+    def fail(path):
+        raise OSError("no such directory")
+
+    monkeypatch.setattr(server, "serve", fail)
+    assert main(["serve", socket_path]) == 1
@@ -1,6 +1,7 @@
 import ast
 
-from pyalect import Dialect
+from pyalect import Dialect, shims
+from pyalect.dialect import _DIALECT_FINGERPRINTS
 
 
 def test_simple_dialect(ipython):
@@ -32,3 +33,49 @@ def test_simple_dialect(ipython):
     assert capture[:2] == [None, "\nx = 1\n\n"]
     assert len(capture) == 3
     assert ast.dump(capture[2]) == ast.dump(ast.parse("x = 1"))
+
+
+def test_rerun_cell_uses_cache(ipython):
+    calls = []
+
+    class MockDialect(Dialect):
+        name = "test"
+        version = "1"
+
+        def __init__(self, filename):
+            calls.append("init")
+
+        def transform_src(self, source):
+            calls.append("src")
+            return source.replace("x", "y")
+
+        def transform_ast(self, node):
+            calls.append("ast")
+            return node
+
+    cell = "%%dialect test\nx = 1\n"
+    ipython.run_cell(cell)
+    ipython.user_ns["y"] = None
+    ipython.run_cell(cell)
+    assert ipython.user_ns["y"] == 1
+    assert calls == ["init", "src", "ast"]
+
+    MockDialect.version = "2"
+    del _DIALECT_FINGERPRINTS[MockDialect]
+    ipython.run_cell(cell)
+    assert calls == ["init", "src", "ast"] * 2
+
+
+def test_failed_cell_does_not_misalign_later_cells(ipython):
+    class MockDialect(Dialect):
+        name = "test"
+
+        def transform_src(self, source):
+            return source.replace("x", "y")
+
+    ipython.run_cell("%%dialect test\nx = (\n")
+    assert not shims._pending_cells
+
+    ipython.run_cell("%%dialect test\nx = 2\n")
+    assert ipython.user_ns["y"] == 2
+    assert not shims._pending_cells